@@ -1,8 +1,22 @@
 import os
+import json
+import hashlib
+import threading
+import time
 import typer
 import requests
 import base64
+import shutil
+import stat
 import subprocess
+import sys
+import tempfile
+import PIL
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, List, Optional
 from dotenv import load_dotenv
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
@@ -96,25 +110,60 @@ def wrap_text_for_ffmpeg(text: str, max_width: int = 50) -> list:
     
     return lines
 
-def composite_video(background_path: Path, face_image_path: Path, title: str, footer: str, output_path: Path):
-    """Composite text and face onto background video using ffmpeg."""
+# Frame rate of the looped face overlay stream (matches ffmpeg's image2 default)
+OVERLAY_FPS = 25
+
+def scratch_root() -> Optional[str]:
+    """Pick where per-job scratch directories live, preferring tmpfs."""
+    override = os.getenv("INTRO_SCRATCH_DIR")
+    if override:
+        return override
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None  # tempfile's default ($TMPDIR, /tmp)
+
+@contextmanager
+def job_scratch(prefix: str = "intro-"):
+    """Yield a private scratch directory for one job, removed when the job ends."""
+    with tempfile.TemporaryDirectory(prefix=prefix, dir=scratch_root()) as scratch_dir:
+        yield Path(scratch_dir)
+
+def publish_file(source: Path, destination: Path):
+    """Move a finished file into place so readers see all of it or none of it.
     
-    # Get video dimensions using ffprobe
+    Scratch and output are on different filesystems, so the file is first copied to
+    a hidden temp name next to the destination and then renamed over it.
+    """
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{destination.name}.", suffix=".part", dir=destination.parent)
+    os.close(fd)
+    try:
+        shutil.copy2(source, tmp_path)  # Also copies the mode; mkstemp creates files 0600
+        os.replace(tmp_path, destination)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    Path(source).unlink()
+
+def probe_video_size(video_path: Path) -> tuple:
+    """Get video dimensions using ffprobe, defaulting to 1080p if it fails."""
     cmd = [
         'ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_streams',
-        str(background_path)
+        str(video_path)
     ]
     
     try:
         result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        import json
         data = json.loads(result.stdout)
         video_stream = next(s for s in data['streams'] if s['codec_type'] == 'video')
-        width = int(video_stream['width'])
-        height = int(video_stream['height'])
+        return int(video_stream['width']), int(video_stream['height'])
     except:
         # Default to 1080p if ffprobe fails
-        width, height = 1920, 1080
+        return 1920, 1080
+
+def build_face_overlay(face_image_path: Path, width: int, height: int) -> Image.Image:
+    """Build the full-frame RGBA face overlay: background removed, grayscale, centered."""
     
     # Process face image with background removal
     face_img = Image.open(face_image_path)
@@ -127,9 +176,6 @@ def composite_video(background_path: Path, face_image_path: Path, title: str, fo
     # Completely new approach - simple but effective background removal
     # Your image appears to be mostly grayscale already, so let's work with that
     
-    # Convert to grayscale for processing but keep original for final output
-    gray_img = np.mean(img_array[:, :, :3], axis=2)
-    
     # Create a very conservative mask - only remove very light pixels
     # Focus on pure white and very light gray only
     background_mask = (
@@ -164,10 +210,23 @@ def composite_video(background_path: Path, face_image_path: Path, title: str, fo
     face_x = (width - face_size) // 2
     face_y = (height - face_size) // 2
     face_overlay.paste(face_img, (face_x, face_y))
+    return face_overlay
+
+def overlay_pipe_args(width: int, height: int) -> list:
+    """FFmpeg input args for a single raw RGBA overlay frame written to stdin."""
+    return [
+        '-f', 'rawvideo', '-pix_fmt', 'rgba',
+        '-video_size', f'{width}x{height}', '-framerate', str(OVERLAY_FPS),
+        '-i', 'pipe:0',
+    ]
+
+def composite_filter_graph(title: str, footer: str, width: int, height: int,
+                           background: str = "0:v", face: str = "1:v", output_label: str = "final") -> str:
+    """Build the filter_complex that fades in the face and draws the title and footer.
     
-    # Save face overlay
-    face_overlay_path = "temp_face_overlay.png"
-    face_overlay.save(face_overlay_path)
+    `face` is a single overlay frame; it is looped here so the fades run on a real
+    timeline, exactly as `-loop 1` on a still image would.
+    """
     
     # Wrap title text properly for multiple lines
     def wrap_text(text, max_chars_per_line=40):
@@ -207,8 +266,11 @@ def composite_video(background_path: Path, face_image_path: Path, title: str, fo
     
     # Build filter complex with proper multiline text support
     filter_parts = []
-    filter_parts.append("[1:v]fade=t=in:st=4:d=0.5:alpha=1,fade=t=out:st=5.5:d=0.5:alpha=1[face]")
-    filter_parts.append("[0:v][face]overlay=0:0[bg_face]")
+    filter_parts.append(
+        f"[{face}]loop=loop=-1:size=1:start=0,setpts=N/{OVERLAY_FPS}/TB,"
+        "fade=t=in:st=4:d=0.5:alpha=1,fade=t=out:st=5.5:d=0.5:alpha=1[face]"
+    )
+    filter_parts.append(f"[{background}][face]overlay=0:0[bg_face]")
     
     # Add each line of title text
     current_input = "bg_face"
@@ -219,56 +281,219 @@ def composite_video(background_path: Path, face_image_path: Path, title: str, fo
     for i, line in enumerate(clean_title_lines):
         y_pos = start_y + (i * line_height)
         if i == len(clean_title_lines) - 1:
-            output_label = "with_title"
+            line_label = "with_title"
         else:
-            output_label = f"title_{i}"
+            line_label = f"title_{i}"
         
         filter_parts.append(
-            f"[{current_input}]drawtext=text='{line}':fontsize={title_fontsize}:fontcolor=white:borderw={title_borderw}:bordercolor=black:x=(w-text_w)/2:y={y_pos}:enable=between(t\\,6\\,8)[{output_label}]"
+            f"[{current_input}]drawtext=text='{line}':fontsize={title_fontsize}:fontcolor=white:borderw={title_borderw}:bordercolor=black:x=(w-text_w)/2:y={y_pos}:enable=between(t\\,6\\,8)[{line_label}]"
         )
-        current_input = output_label
+        current_input = line_label
     
     # Add footer
     filter_parts.append(
-        f"[with_title]drawtext=text='{clean_footer}':fontsize={footer_fontsize}:fontcolor=white:borderw={footer_borderw}:bordercolor=black:x=40:y=h-text_h-40:enable=between(t\\,6.5\\,8)[final]"
+        f"[with_title]drawtext=text='{clean_footer}':fontsize={footer_fontsize}:fontcolor=white:borderw={footer_borderw}:bordercolor=black:x=40:y=h-text_h-40:enable=between(t\\,6.5\\,8)[{output_label}]"
     )
     
-    filter_complex = ";".join(filter_parts)
+    return ";".join(filter_parts)
+
+# ---------------------------------------------------------------------------
+# Decoded background mezzanine cache
+# ---------------------------------------------------------------------------
+
+MEZZANINE_DIR = Path("cache/mezzanine")
+MEZZANINE_MAX_MB = int(os.getenv("INTRO_MEZZANINE_MAX_MB", "2048"))
+
+# Bytes per pixel for the pixel formats we can store as raw frames
+RAW_BYTES_PER_PIXEL = {
+    "yuv420p": 1.5, "yuvj420p": 1.5, "nv12": 1.5,
+    "yuv422p": 2, "yuvj422p": 2,
+    "yuv444p": 3, "yuvj444p": 3, "rgb24": 3,
+}
+
+def mezzanine_footprint(mezzanine_dir: Path = MEZZANINE_DIR) -> int:
+    return sum(p.stat().st_size for p in mezzanine_dir.glob("*") if p.is_file())
+
+def evict_mezzanines(keep_bytes: int, mezzanine_dir: Path = MEZZANINE_DIR, exclude: str = None):
+    """Drop least recently used mezzanines until the cache fits in keep_bytes."""
+    entries = sorted(mezzanine_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+    for meta_path in entries:
+        if mezzanine_footprint(mezzanine_dir) <= keep_bytes:
+            return
+        if meta_path.stem == exclude:
+            continue
+        for stale in mezzanine_dir.glob(f"{meta_path.stem}.*"):
+            stale.unlink()
+
+def find_mezzanine(background_path: Path, mezzanine_dir: Path = MEZZANINE_DIR,
+                   max_mb: int = MEZZANINE_MAX_MB) -> Optional[dict]:
+    """Return the mezzanine metadata for this exact background content, if cached.
+    
+    A background known to be too big for the cap comes back with format "none", so
+    callers skip straight to decoding it instead of building a mezzanine again.
+    """
+    meta_path = mezzanine_dir / f"{file_digest(background_path)[:16]}.json"
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text())
+    if meta["format"] == "none":
+        # Worth another try only if the cap has been raised since
+        if meta["bytes"] <= max_mb * 1024 * 1024:
+            return None
+    elif not Path(meta["path"]).exists() or "colors" not in meta:
+        # Entries from before colour tags were recorded would drop them from renders
+        return None
+    meta_path.touch()  # Mark as recently used for eviction
+    return meta
+
+def build_mezzanine(background_path: Path, max_mb: int = MEZZANINE_MAX_MB,
+                    mezzanine_dir: Path = MEZZANINE_DIR) -> Optional[dict]:
+    """Decode the background once into raw frames (or FFV1 intra-only if raw is too big).
     
+    Returns the metadata. If even the lossless fallback exceeds max_mb, that is
+    recorded as format "none" so later renders don't repeat the encode.
+    """
+    key = file_digest(background_path)[:16]
     cmd = [
-        'ffmpeg', '-y',  # Overwrite output
-        '-i', str(background_path),  # Background video
-        '-loop', '1', '-i', face_overlay_path,  # Face overlay
-        '-filter_complex', filter_complex,
-        '-map', '[final]',
-        '-map', '0:a',  # Keep original audio
-        '-c:a', 'copy',  # Copy audio without re-encoding
-        '-c:v', 'libx264',
-        '-t', '8',  # Duration 8 seconds
-        str(output_path)
+        'ffprobe', '-v', 'quiet', '-print_format', 'json', '-count_packets',
+        '-show_streams', '-select_streams', 'v:0', str(background_path)
     ]
+    stream = json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)['streams'][0]
+    width, height = int(stream['width']), int(stream['height'])
+    pix_fmt = stream['pix_fmt']
+    frames = int(stream.get('nb_read_packets') or 0)
+    max_bytes = max_mb * 1024 * 1024
     
+    bytes_per_pixel = RAW_BYTES_PER_PIXEL.get(pix_fmt)
+    raw_bytes = int(width * height * bytes_per_pixel * frames) if bytes_per_pixel else None
+    if raw_bytes is not None and raw_bytes <= max_bytes:
+        fmt, suffix = "raw", ".yuv"
+        encode_args = ['-f', 'rawvideo', '-pix_fmt', pix_fmt]
+    else:
+        # 4K backgrounds: intra-only lossless still skips H.264's inter prediction
+        fmt, suffix = "ffv1", ".mkv"
+        encode_args = ['-c:v', 'ffv1', '-level', '3', '-g', '1', '-slices', '16', '-pix_fmt', pix_fmt]
+    
+    mezzanine_dir.mkdir(parents=True, exist_ok=True)
+    data_path = mezzanine_dir / f"{key}{suffix}"
+    tmp_path = mezzanine_dir / f"{key}.{os.getpid()}.tmp{suffix}"
     try:
-        subprocess.run(cmd, check=True, capture_output=True)
-        typer.echo("✅ Video compositing completed")
-    except subprocess.CalledProcessError as e:
-        typer.echo(f"❌ FFmpeg error: {e.stderr.decode()}")
-        raise
+        # The build is one full decode plus the raw write or FFV1 encode, so renders
+        # can report its time as an upper bound on the decode they skip
+        started = time.time()
+        subprocess.run(['ffmpeg', '-y', '-v', 'error', '-i', str(background_path), '-map', '0:v:0',
+                        *encode_args, str(tmp_path)], check=True, capture_output=True)
+        decode_seconds = time.time() - started
+        size = tmp_path.stat().st_size
+        if size > max_bytes:
+            typer.echo(f"⚠️ Decoded background needs {size / 2**20:.0f} MB (cap {max_mb} MB); not caching")
+            meta = {"source": str(background_path), "source_digest": key, "format": "none", "bytes": size}
+        else:
+            # Make room for the real size; the footprint already counts tmp_path
+            evict_mezzanines(max_bytes, mezzanine_dir, exclude=key)
+            os.replace(tmp_path, data_path)
+            meta = {
+                "source": str(background_path), "source_digest": key, "format": fmt, "path": str(data_path),
+                "width": width, "height": height, "pix_fmt": pix_fmt, "frame_rate": stream['r_frame_rate'],
+                "frames": frames, "bytes": size, "decode_seconds": decode_seconds,
+                # Raw frames carry no colour tags, so they are re-applied on input
+                "colors": {tag: stream[tag] for tag in COLOR_TAGS if stream.get(tag, 'unknown') != 'unknown'},
+            }
     finally:
-        # Clean up temporary files
-        if os.path.exists(face_overlay_path):
-            os.remove(face_overlay_path)
+        if tmp_path.exists():
+            tmp_path.unlink()
+    
+    meta_tmp = mezzanine_dir / f"{key}.{os.getpid()}.tmp.json"
+    meta_tmp.write_text(json.dumps(meta, indent=2))
+    os.replace(meta_tmp, mezzanine_dir / f"{key}.json")
+    if meta["format"] != "none":
+        typer.echo(f"🧊 Cached decoded background ({fmt}, {meta['bytes'] / 2**20:.0f} MB) at {data_path}")
+    return meta
 
-@app.command()
-def generate_background(
-    api_key: str = typer.Option(None, "--api-key", "-k", help="fal.ai API key"),
-    output_path: Path = typer.Option("cache/background.mp4", help="Path to save background video"),
-):
-    """Generate and cache the background video (one-time setup)."""
-    key = get_api_key(api_key)
+def mezzanine_input_args(meta: dict) -> list:
+    """FFmpeg input args that read the mezzanine with no H.264 decode.
+    
+    The background's colour tags are set on the input, so the intro is tagged the
+    same as when it is encoded from the decoded H.264.
+    """
+    colors = [arg for tag, value in meta["colors"].items() for arg in (COLOR_TAGS[tag], value)]
+    if meta["format"] == "raw":
+        return [
+            '-f', 'rawvideo', '-pix_fmt', meta["pix_fmt"],
+            '-video_size', f'{meta["width"]}x{meta["height"]}', '-framerate', meta["frame_rate"],
+            *colors, '-i', meta["path"],
+        ]
+    return [*colors, '-i', meta["path"]]
+
+def background_inputs(background_path: Path, use_mezzanine: bool = True,
+                      mezzanine_dir: Path = MEZZANINE_DIR) -> tuple:
+    """FFmpeg args for the background, split around the overlay input, plus its audio map.
+    
+    Returns (args before the overlay, args after it, audio map). The background's
+    frames are always input 0 and the overlay input 1; with a mezzanine the original
+    file is added as input 2 purely for its audio, which is demuxed but never decoded.
+    """
+    mezzanine = None
+    if use_mezzanine:
+        try:
+            mezzanine = (find_mezzanine(background_path, mezzanine_dir)
+                         or build_mezzanine(background_path, mezzanine_dir=mezzanine_dir))
+        except (OSError, subprocess.CalledProcessError, KeyError, IndexError, ValueError) as e:
+            typer.echo(f"⚠️ Could not cache decoded background, decoding it directly: {e}")
+    
+    if mezzanine is not None and mezzanine["format"] == "none":
+        typer.echo(f"⏱️ Decoded background would need {mezzanine['bytes'] / 2**20:.0f} MB, over the cache cap; "
+                   "decoding it directly")
+        mezzanine = None
+    if mezzanine is None:
+        return ['-i', str(background_path)], [], '0:a'
+    
+    typer.echo(f"⏱️ Using decoded background cache: skips H.264 decode "
+               f"(estimated at up to ~{mezzanine['decode_seconds']:.1f}s, the time the cache took to build)")
+    return mezzanine_input_args(mezzanine), ['-i', str(background_path)], '2:a'
+
+def composite_video(background_path: Path, face_image_path: Path, title: str, footer: str, output_path: Path,
+                    use_mezzanine: bool = True, mezzanine_dir: Path = MEZZANINE_DIR):
+    """Composite text and face onto background video using ffmpeg.
     
-    # Create clean background animation (no text, no faces)
-    video_prompt = """
+    The face overlay is streamed to ffmpeg as raw RGBA on stdin and the video is
+    encoded inside a private scratch directory, so concurrent renders in the same
+    directory never share temp files.
+    """
+    
+    width, height = probe_video_size(background_path)
+    face_overlay = build_face_overlay(face_image_path, width, height)
+    filter_complex = composite_filter_graph(title, footer, width, height)
+    background_args, audio_args, audio_map = background_inputs(background_path, use_mezzanine, mezzanine_dir)
+    
+    with job_scratch() as scratch_dir:
+        scratch_output = scratch_dir / Path(output_path).name
+        cmd = [
+            'ffmpeg', '-y',  # Overwrite output
+            *background_args,  # Background video (or its decoded cache)
+            *overlay_pipe_args(width, height),  # Face overlay (raw RGBA on stdin)
+            *audio_args,
+            '-filter_complex', filter_complex,
+            '-map', '[final]',
+            '-map', audio_map,  # Keep original audio
+            '-c:a', 'copy',  # Copy audio without re-encoding
+            '-c:v', 'libx264',
+            '-t', '8',  # Duration 8 seconds
+            str(scratch_output)
+        ]
+        
+        try:
+            subprocess.run(cmd, input=face_overlay.tobytes(), check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            typer.echo(f"❌ FFmpeg error: {e.stderr.decode()}")
+            raise
+        
+        # Publish the finished file in one step; readers never see a partial intro
+        publish_file(scratch_output, output_path)
+        typer.echo("✅ Video compositing completed")
+
+# Clean background animation (no text, no faces)
+BACKGROUND_PROMPT = """
     Create a cinematic noir-style spacetime animation in black and white, Twilight Zone aesthetic:
     
     0-2s: Fade in from black. A warped 3D spacetime grid oscillates over a starfield.
@@ -281,14 +506,23 @@ def generate_background(
     IMPORTANT: NO TEXT, NO FACES, NO PEOPLE - just pure abstract spacetime geometry.
     Clean background suitable for compositing text and images later.
     """
+
+BACKGROUND_PAYLOAD = {
+    "duration": "8s",
+    "aspect_ratio": "16:9", 
+    "resolution": "1080p",
+    "generate_audio": True
+}
+
+@app.command()
+def generate_background(
+    api_key: str = typer.Option(None, "--api-key", "-k", help="fal.ai API key"),
+    output_path: Path = typer.Option("cache/background.mp4", help="Path to save background video"),
+):
+    """Generate and cache the background video (one-time setup)."""
+    key = get_api_key(api_key)
     
-    payload = {
-        "prompt": video_prompt.strip(),
-        "duration": "8s",
-        "aspect_ratio": "16:9", 
-        "resolution": "1080p",
-        "generate_audio": True
-    }
+    payload = dict(BACKGROUND_PAYLOAD, prompt=BACKGROUND_PROMPT.strip())
     
     typer.echo("🎬 Generating background video...")
     headers = {"Authorization": f"Key {key}"}
@@ -325,6 +559,7 @@ def main(
     reference_image: Path = typer.Option(..., help="Reference face image path"),
     background_video: Path = typer.Option("cache/background.mp4", help="Path to cached background video"),
     output_path: Path = typer.Option("intro.mp4", help="Path to save output video"),
+    mezzanine: bool = typer.Option(True, help="Read the background from a decoded-frame cache instead of decoding H.264 each time"),
 ):
     """
     Generate a cinematic YouTube intro with custom face and text using cached background
@@ -340,112 +575,1165 @@ def main(
     
     # Composite text and face locally
     typer.echo("🎬 Compositing text and face locally...")
-    composite_video(background_video, reference_image, title, footer, output_path)
+    composite_video(background_video, reference_image, title, footer, output_path, mezzanine)
     typer.echo(f"✅ Final intro saved to {output_path}")
 
 @app.command()
-def combine(
-    intro_video: Path = typer.Option(..., help="Path to intro video"),
-    main_video: Path = typer.Option(..., help="Path to main content video"),
-    output_path: Path = typer.Option("combined.mp4", help="Path to save combined video"),
-    transition_duration: float = typer.Option(0.8, help="Cross-fade transition duration in seconds"),
+def prepare_mezzanine(
+    background_video: Path = typer.Option("cache/background.mp4", help="Path to cached background video"),
+    max_mb: int = typer.Option(MEZZANINE_MAX_MB, help="Disk cap for the decoded background cache in MB"),
 ):
     """
-    Combine intro video with main content video, matching main video's settings
+    Decode the background once into cache/mezzanine so every render skips H.264 decode
     """
-    
-    # Check if both videos exist
-    if not intro_video.exists():
-        typer.echo(f"❌ Intro video not found at {intro_video}")
+    if not background_video.exists():
+        typer.echo(f"❌ Background video not found at {background_video}")
         raise typer.Exit(1)
     
-    if not main_video.exists():
-        typer.echo(f"❌ Main video not found at {main_video}")
+    meta = find_mezzanine(background_video, max_mb=max_mb) or build_mezzanine(background_video, max_mb)
+    if meta["format"] == "none":
+        typer.echo(f"❌ Decoded background needs {meta['bytes'] / 2**20:.0f} MB, over the {max_mb} MB cap; "
+                   "renders will decode it directly")
         raise typer.Exit(1)
     
-    typer.echo(f"🎬 Combining {intro_video} + {main_video}")
-    
-    # Get main video properties to match settings
-    typer.echo("📊 Analyzing main video settings...")
+    typer.echo(f"📦 {meta['format']} mezzanine: {meta['width']}x{meta['height']} {meta['pix_fmt']}, "
+               f"{meta['frames']} frames, {meta['bytes'] / 2**20:.0f} MB")
+    typer.echo(f"⏱️ Each render skips H.264 decode, estimated at up to ~{meta['decode_seconds']:.1f}s "
+               "(the time the cache took to build)")
+    typer.echo(f"💾 Cache footprint: {mezzanine_footprint() / 2**20:.0f} MB of {max_mb} MB")
+
+# ---------------------------------------------------------------------------
+# Combining intro + main video
+# ---------------------------------------------------------------------------
+
+# Encoders whose output the main video's packets can be appended to without re-encoding
+STREAM_COPY_VIDEO_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+STREAM_COPY_AUDIO_ENCODERS = {"aac": "aac", "mp3": "libmp3lame", "opus": "libopus"}
+X264_PROFILES = {
+    "Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high",
+    "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444",
+}
+# ffprobe stream field -> ffmpeg output option
+COLOR_TAGS = {
+    "color_range": "-color_range", "color_space": "-colorspace",
+    "color_transfer": "-color_trc", "color_primaries": "-color_primaries",
+}
+FRAGMENTED_MOVFLAGS = "+frag_keyframe+empty_moov+delay_moov+default_base_moof"
+
+def probe_media(video_path: Path) -> dict:
+    """Run ffprobe and return the parsed streams and format, with hashes of codec extradata."""
     cmd = [
         'ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_streams', '-show_format',
-        str(main_video)
+        '-show_data_hash', 'sha256', str(video_path)
     ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+def main_video_settings(data: dict) -> dict:
+    """The stream parameters an intro has to match to be joined onto this video."""
+    video_stream = next(s for s in data['streams'] if s['codec_type'] == 'video')
+    audio_stream = next((s for s in data['streams'] if s['codec_type'] == 'audio'), None)
+    return {
+        "width": int(video_stream['width']),
+        "height": int(video_stream['height']),
+        "frame_rate": video_stream['r_frame_rate'],
+        "video_codec": video_stream.get('codec_name'),
+        "profile": video_stream.get('profile'),
+        "pix_fmt": video_stream.get('pix_fmt', 'yuv420p'),
+        "timescale": int(video_stream.get('time_base', '1/90000').split('/')[1]),
+        "level": video_stream.get('level'),
+        "sample_aspect_ratio": video_stream.get('sample_aspect_ratio') if video_stream.get('sample_aspect_ratio', '0:1') not in ('0:1', 'N/A') else None,
+        **{tag: video_stream[tag] for tag in COLOR_TAGS if video_stream.get(tag, 'unknown') != 'unknown'},
+        # avcC/hvcC: SPS/PPS (refs, entropy coder, VUI, ...) a joined intro must share
+        "extradata": video_stream.get('extradata_hash'),
+        "audio_codec": audio_stream.get('codec_name') if audio_stream else None,
+        "sample_rate": audio_stream.get('sample_rate', '44100') if audio_stream else '44100',
+        "channels": audio_stream.get('channels', 2) if audio_stream else 2,
+    }
+
+def probe_main_video(video_path: Path) -> dict:
+    """main_video_settings plus the audio packet layout a stream-copy join has to line up with.
     
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        import json
-        data = json.loads(result.stdout)
-        
-        # Get video stream info
-        video_stream = next(s for s in data['streams'] if s['codec_type'] == 'video')
-        audio_stream = next((s for s in data['streams'] if s['codec_type'] == 'audio'), None)
-        
-        width = int(video_stream['width'])
-        height = int(video_stream['height'])
-        fps = eval(video_stream['r_frame_rate'])  # Convert fraction to float
-        
-        typer.echo(f"📺 Main video: {width}x{height} @ {fps:.1f}fps")
-        
-    except Exception as e:
-        typer.echo(f"❌ Error analyzing main video: {e}")
-        raise typer.Exit(1)
+    audio_priming is the encoder delay in the first packet (negative pts). Mid-stream
+    there is no edit list to hide it, so after a join it plays before the main audio.
+    """
+    settings = main_video_settings(probe_media(video_path))
+    if settings["audio_codec"]:
+        cmd = [
+            'ffprobe', '-v', 'quiet', '-print_format', 'json', '-select_streams', 'a:0',
+            '-show_entries', 'stream=time_base:packet=pts,duration', '-read_intervals', '%+#2', str(video_path)
+        ]
+        data = json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)
+        numerator, denominator = map(int, data['streams'][0]['time_base'].split('/'))
+        to_samples = lambda ticks: round(int(ticks) * numerator * int(settings["sample_rate"]) / denominator)
+        packets = data.get('packets', [])
+        if packets and 'duration' in packets[-1]:
+            settings["audio_priming"] = max(0, -to_samples(packets[0].get('pts', 0)))
+            settings["audio_frame"] = to_samples(packets[-1]['duration'])
+    return settings
+
+def stream_copy_blockers(settings: dict) -> list:
+    """Reasons the main video cannot be stream-copied after a conformed intro."""
+    blockers = []
+    if settings["video_codec"] not in STREAM_COPY_VIDEO_ENCODERS:
+        blockers.append(f"video codec {settings['video_codec']} has no matching encoder")
+    if settings["audio_codec"] not in STREAM_COPY_AUDIO_ENCODERS:
+        blockers.append(f"audio codec {settings['audio_codec']} has no matching encoder")
+    return blockers
+
+def conform_intro(intro_video: Path, settings: dict, output_path: Path, threads: int = None):
+    """Encode the intro once in the main video's exact stream parameters.
     
-    # Create the combination with cross-fade transition
-    typer.echo(f"🔗 Combining videos with {transition_duration}s cross-fade...")
+    The result can be concatenated with the main video by stream copy.
+    """
+    cmd = [
+        'ffmpeg', '-y', '-i', str(intro_video),
+        '-vf', conform_filter(settings),
+        *conformed_intro_args(settings, threads),
+        str(output_path)
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+def prescale_intro(intro_video: Path, settings: dict, output_path: Path, threads: int = None):
+    """Scale and trim the intro once, losslessly, for re-encoding in front of many main videos.
     
-    # Get original audio info to preserve settings
-    try:
-        # Check main video audio settings
-        main_audio_info = next((s for s in data['streams'] if s['codec_type'] == 'audio'), None)
-        if main_audio_info:
-            original_sample_rate = main_audio_info.get('sample_rate', '44100')
-            original_channels = main_audio_info.get('channels', 2)
-            typer.echo(f"🎵 Main video audio: {original_sample_rate}Hz, {original_channels} channels")
-        else:
-            original_sample_rate = '44100'
-            original_channels = 2
-    except:
-        original_sample_rate = '44100'
-        original_channels = 2
+    FFV1 video and float PCM audio decode to exactly the frames and samples the
+    re-encode path would have produced from the original intro, so its scale and
+    atrim become no-ops.
+    """
+    cmd = [
+        'ffmpeg', '-y', '-i', str(intro_video),
+        '-map', '0:v:0', '-map', '0:a:0',
+        '-vf', f"scale={settings['width']}:{settings['height']}",
+        '-af', 'atrim=end=8.0',
+        '-c:v', 'ffv1', '-level', '3',
+        '-c:a', 'pcm_f32le',
+        *(['-threads', str(threads)] if threads else []),
+        str(output_path)
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+def conform_filter(settings: dict) -> str:
+    """Video filter that brings an intro to the main video's size, frame rate, pixel format and SAR."""
+    sar = f",setsar={settings['sample_aspect_ratio']}" if settings.get("sample_aspect_ratio") else ""
+    return f"scale={settings['width']}:{settings['height']},fps={settings['frame_rate']},format={settings['pix_fmt']}{sar}"
+
+def conformed_intro_args(settings: dict, threads: int = None) -> list:
+    """Encoder args for an 8 second intro in the main video's exact stream parameters."""
+    video_encoder = STREAM_COPY_VIDEO_ENCODERS[settings["video_codec"]]
+    profile = X264_PROFILES.get(settings["profile"]) if video_encoder == "libx264" else None
+    level = f"{settings['level'] / 10:g}" if video_encoder == "libx264" and (settings.get("level") or 0) > 0 else None
+    audio_filter = []
+    if settings.get("audio_frame"):
+        # End the intro's audio on a whole packet, placed so that the main video's
+        # priming plus its first sample land as close to 8 seconds as packets allow
+        rate, frame = int(settings["sample_rate"]), settings["audio_frame"]
+        end_sample = round((8 * rate - settings["audio_priming"]) / frame) * frame
+        audio_filter = ['-af', f"aresample={rate},atrim=end_sample={end_sample}"]
+    return [
+        '-c:v', video_encoder,
+        *(['-profile:v', profile] if profile else []),
+        *(['-level', level] if level else []),
+        *[arg for tag, option in COLOR_TAGS.items() if tag in settings for arg in (option, settings[tag])],
+        '-c:a', STREAM_COPY_AUDIO_ENCODERS[settings["audio_codec"]],
+        '-b:a', '192k',
+        '-ar', str(settings["sample_rate"]),
+        '-ac', str(settings["channels"]),
+        *audio_filter,
+        '-video_track_timescale', str(settings["timescale"]),
+        *(['-threads', str(threads)] if threads else []),
+        '-t', '8',  # Same 8 second cut as atrim=end=8 in the re-encode path
+    ]
+
+def parameter_set_mismatch(conformed_intro: Path, settings: dict) -> Optional[str]:
+    """Why a conformed intro can't be stream-copied in front of the main video, if it can't.
     
-    # Completely different approach - create one command that handles everything properly
-    intro_duration = 8.0
+    The MP4 muxer keeps only the first file's avcC/hvcC, so the intro's SPS/PPS have
+    to be byte-identical to the main video's or strict players decode the main video
+    with the wrong parameters.
+    """
+    video_stream = next(s for s in probe_media(conformed_intro)['streams'] if s['codec_type'] == 'video')
+    if settings.get("extradata") and video_stream.get('extradata_hash') == settings["extradata"]:
+        return None
+    return "main video's SPS/PPS differ from what the intro encoder writes"
+
+def predict_parameter_set_mismatch(input_args: list, settings: dict, scratch_dir: Path) -> Optional[str]:
+    """parameter_set_mismatch for an intro made from these input frames, judged from one frame.
     
-    cmd = [
+    The SPS/PPS depend on the encoder settings and the frames' size, format and tags,
+    not on how many frames follow, so a one-frame encode tells before a full intro
+    encode is spent on it.
+    """
+    preview_path = scratch_dir / "preview.mp4"
+    subprocess.run([
+        'ffmpeg', '-y', *input_args,
+        '-vf', conform_filter(settings),
+        *conformed_intro_args(settings),
+        '-frames:v', '1', '-an',
+        str(preview_path)
+    ], check=True, capture_output=True)
+    return parameter_set_mismatch(preview_path, settings)
+
+def concat_copy_cmd(intro_video: Path, main_video: Path, concat_list: Path, output_path: Path,
+                    fragmented: bool) -> list:
+    """FFmpeg command joining a conformed intro and the main video by stream copy.
+    
+    The concat demuxer joins the streams packet by packet, no decode. inpoint 0 stops
+    AAC priming (negative timestamps) from shifting each file, and outpoint cuts the
+    intro at exactly 8 seconds.
+    """
+    concat_list.write_text(concat_entry(intro_video, outpoint=8.0) + concat_entry(main_video))
+    return [
         'ffmpeg', '-y',
-        '-i', str(intro_video),   # Input 0: intro video
-        '-i', str(main_video),    # Input 1: main video  
-        '-filter_complex',
-        f'''
-        [0:v]scale={width}:{height}[intro_v];
-        [1:v]scale={width}:{height}[main_v];
-        [intro_v][main_v]concat=n=2:v=1:a=0[final_v];
-        [0:a]atrim=end={intro_duration}[intro_a];
-        [intro_a][1:a]concat=n=2:v=0:a=1[final_a]
-        ''',
+        '-f', 'concat', '-safe', '0', '-i', str(concat_list),
+        '-map', '0:v:0', '-map', '0:a:0',
+        '-c', 'copy',
+        '-copyts',  # Keep priming offsets in edit lists instead of shifting video
+        *output_args(output_path, fragmented)
+    ]
+
+def reencode_join_graph(intro_video: str, intro_audio: str, main_index: int, settings: dict) -> str:
+    """Filtergraph scaling the intro and main video to the main video's size and joining them.
+    
+    The intro's audio is cut at 8 seconds; the outputs are [final_v] and [final_a].
+    """
+    width, height = settings["width"], settings["height"]
+    return ";".join([
+        f"[{intro_video}]scale={width}:{height}[intro_v]",
+        f"[{main_index}:v]scale={width}:{height}[main_v]",
+        "[intro_v][main_v]concat=n=2:v=1:a=0[final_v]",
+        f"[{intro_audio}]atrim=end=8.0[intro_a]",
+        f"[intro_a][{main_index}:a]concat=n=2:v=0:a=1[final_a]",
+    ])
+
+def reencode_join_args(settings: dict, threads: int = None) -> list:
+    """Map and encoder args for the output of reencode_join_graph."""
+    return [
         '-map', '[final_v]',
         '-map', '[final_a]',
         '-c:v', 'libx264',
         '-c:a', 'aac',
         '-b:a', '192k',
-        '-ar', str(original_sample_rate),
-        '-ac', str(original_channels),
+        '-ar', str(settings["sample_rate"]),
+        '-ac', str(settings["channels"]),
         '-shortest',  # End when shortest stream ends
-        '-movflags', '+faststart',
         '-pix_fmt', 'yuv420p',
-        str(output_path)
+        *(['-threads', str(threads)] if threads else []),
     ]
+
+def concat_entry(path: Path, outpoint: float = None) -> str:
+    """One file entry for an ffmpeg concat demuxer script."""
+    quoted = str(Path(path).resolve()).replace("'", "'\\''")
+    entry = f"file '{quoted}'\ninpoint 0\n"
+    if outpoint is not None:
+        entry += f"outpoint {outpoint}\n"
+    return entry
+
+def is_fifo(path: Path) -> bool:
+    return path.exists() and stat.S_ISFIFO(path.stat().st_mode)
+
+def output_args(output_path: Path, fragmented: bool) -> list:
+    """Muxer args and target for a faststart file, or a fragmented MP4 file/pipe/FIFO."""
+    target = 'pipe:1' if str(output_path) == '-' else str(output_path)
+    if fragmented:
+        # Each keyframe starts a self-contained fragment, so readers can start right away
+        return ['-movflags', FRAGMENTED_MOVFLAGS, '-f', 'mp4', target]
+    return ['-movflags', '+faststart', target]
+
+def mp4_playable(path: Path) -> bool:
+    """True once an MP4 starts with a complete moov followed by media.
+    
+    A faststart file only gets there after its final rewrite; a fragmented one as
+    soon as its first fragment is written.
+    """
+    try:
+        with open(path, 'rb') as f:
+            offset, seen_moov = 0, False
+            while True:
+                f.seek(offset)
+                header = f.read(16)
+                if len(header) < 8:
+                    return False
+                size, box = int.from_bytes(header[:4], 'big'), header[4:8]
+                if box == b'moov':
+                    seen_moov = True
+                elif box in (b'moof', b'mdat'):
+                    return seen_moov
+                if size == 1 and len(header) == 16:
+                    size = int.from_bytes(header[8:16], 'big')
+                if size < 8:
+                    return False
+                offset += size
+    except OSError:
+        return False
+
+def run_ffmpeg_timed(cmd: list, watch_path: Path = None, started: float = None, input: bytes = None) -> dict:
+    """Run ffmpeg, timing total wall time and, for a file output, time to first playable byte.
+    
+    Times count from `started` (default: now) so callers can include preparation
+    steps. stdout is inherited so `pipe:1` outputs reach our caller's stdout; `input`
+    is fed to ffmpeg's stdin from a background thread.
+    """
+    started = started or time.time()
+    first_playable = None
+    if watch_path is not None:
+        # A previous run's complete file would count as playable before ffmpeg truncates it
+        Path(watch_path).unlink(missing_ok=True)
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL if input is None else subprocess.PIPE, stderr=stderr)
+        if input is not None:
+            def feed():
+                try:
+                    process.stdin.write(input)
+                    process.stdin.close()
+                except (BrokenPipeError, ValueError):
+                    pass  # ffmpeg exited early; its return code tells the story
+            threading.Thread(target=feed, daemon=True).start()
+        while process.poll() is None:
+            if watch_path is not None and first_playable is None and mp4_playable(watch_path):
+                first_playable = time.time() - started
+            time.sleep(0.01)
+        wall = time.time() - started
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(process.returncode, cmd, stderr=stderr.read())
+    if watch_path is not None and first_playable is None and mp4_playable(watch_path):
+        first_playable = wall
+    return {"first_playable": first_playable, "wall": wall}
+
+def combine_videos(intro_video: Path, main_video: Path, output_path: Path, transition_duration: float = 0.8,
+                   fragmented: bool = False, stream_copy: bool = False, measure: bool = False,
+                   settings: dict = None, conformed_intro: Path = None, threads: int = None,
+                   quiet: bool = False, prescaled_intro: Path = None) -> dict:
+    """Combine intro video with main content video, matching main video's settings.
+    
+    Returns the ffmpeg timings. With stream_copy the intro is conformed to the main
+    video's parameters and the main video is copied, not re-encoded. Batch callers can
+    pass the already probed `settings` and an intro already conformed to them, or
+    prescaled for re-encoding.
+    """
+    to_stdout = str(output_path) == '-'
+    # Status goes to stderr when the video itself is going to stdout
+    say = lambda message: None if quiet else typer.echo(message, err=to_stdout)
+    
+    # Check if both videos exist
+    if not intro_video.exists():
+        say(f"❌ Intro video not found at {intro_video}")
+        raise typer.Exit(1)
+    
+    if not main_video.exists():
+        say(f"❌ Main video not found at {main_video}")
+        raise typer.Exit(1)
+    
+    if not fragmented and (to_stdout or is_fifo(output_path)):
+        say("📡 Pipes and FIFOs can't be rewritten for faststart; writing fragmented MP4")
+        fragmented = True
+    
+    say(f"🎬 Combining {intro_video} + {main_video}")
+    
+    # Get main video properties to match settings
+    say("📊 Analyzing main video settings...")
+    try:
+        if settings is None:
+            settings = probe_main_video(main_video)
+        width, height = settings["width"], settings["height"]
+        fps = eval(settings["frame_rate"])  # Convert fraction to float
+        say(f"📺 Main video: {width}x{height} @ {fps:.1f}fps")
+    except Exception as e:
+        say(f"❌ Error analyzing main video: {e}")
+        raise typer.Exit(1)
+    
+    if settings["audio_codec"]:
+        say(f"🎵 Main video audio: {settings['sample_rate']}Hz, {settings['channels']} channels")
     
+    if stream_copy:
+        blockers = stream_copy_blockers(settings)
+        if blockers:
+            say(f"⚠️ Can't stream-copy main video ({'; '.join(blockers)}); re-encoding instead")
+            stream_copy = False
+    
+    watch_path = None if to_stdout or is_fifo(output_path) else output_path
+    started = time.time()
     try:
-        typer.echo("🔗 Combining videos with proper audio handling...")
-        subprocess.run(cmd, check=True, capture_output=True)
-        typer.echo(f"✅ Combined video saved to {output_path}")
-        typer.echo(f"📊 Output matches main video settings: {width}x{height} @ {fps:.1f}fps")
+        if stream_copy:
+            with job_scratch("combine-") as scratch_dir:
+                conformed = conformed_intro
+                if conformed is None:
+                    say("🎞️ Conforming intro to main video settings...")
+                    conformed = scratch_dir / "intro_conformed.mp4"
+                    conform_intro(intro_video, settings, conformed, threads)
+                
+                mismatch = parameter_set_mismatch(conformed, settings)
+                if mismatch:
+                    say(f"⚠️ Can't stream-copy main video ({mismatch}); re-encoding instead")
+                    stream_copy = False
+                else:
+                    cmd = concat_copy_cmd(conformed, main_video, scratch_dir / "concat.txt", output_path, fragmented)
+                    say("🔗 Joining conformed intro and main video by stream copy...")
+                    timings = run_ffmpeg_timed(cmd, watch_path, started)
+        if not stream_copy:
+            # Completely different approach - create one command that handles everything properly
+            say(f"🔗 Combining videos with {transition_duration}s cross-fade...")
+            cmd = [
+                'ffmpeg', '-y',
+                '-i', str(prescaled_intro or intro_video),   # Input 0: intro video
+                '-i', str(main_video),    # Input 1: main video  
+                '-filter_complex', reencode_join_graph("0:v", "0:a", 1, settings),
+                *reencode_join_args(settings, threads),
+                *output_args(output_path, fragmented)
+            ]
+            say("🔗 Combining videos with proper audio handling...")
+            timings = run_ffmpeg_timed(cmd, watch_path, started)
+    except subprocess.CalledProcessError as e:
+        say(f"❌ FFmpeg error: {e.stderr.decode()}")
+        raise
+    
+    timings["stream_copy"] = stream_copy
+    say(f"✅ Combined video saved to {'stdout' if to_stdout else output_path}")
+    say(f"📊 Output matches main video settings: {width}x{height} @ {fps:.1f}fps")
+    if measure:
+        first = timings["first_playable"]
+        say(f"⏱️ Time to first playable byte: {'n/a' if first is None else f'{first:.2f}s'}, "
+            f"total: {timings['wall']:.2f}s")
+    return timings
+
+def settings_label(settings: dict) -> str:
+    fps = eval(settings["frame_rate"])
+    audio = f"{settings['audio_codec']} {settings['sample_rate']}Hz/{settings['channels']}ch" if settings["audio_codec"] else "no audio"
+    video = " ".join(str(part) for part in (settings["video_codec"], settings["profile"], settings["pix_fmt"]) if part)
+    return f"{settings['width']}x{settings['height']}@{fps:g} {video}, {audio}"
+
+def combine_batch(intro_video: Path, main_videos: List[Path], output_dir: Path, transition_duration: float = 0.8,
+                  fragmented: bool = False, stream_copy: bool = False, cores: int = None,
+                  threads_per_job: int = 4) -> bool:
+    """Prepend one intro to many main videos, preparing the intro once per stream signature.
+    
+    Main videos are grouped by what their intro has to match: every stream setting
+    for stream copy, only the frame size for re-encoding. Each group shares one intro
+    conformed for stream copy, or prescaled for re-encoding. Episodes then run
+    concurrently within a core budget: stream-copy joins are I/O bound and take one
+    core each, re-encodes take threads_per_job. Returns False if any episode failed.
+    """
+    cores = cores or os.cpu_count() or 1
+    batch_started = time.time()
+    
+    missing = [video for video in main_videos if not video.exists()]
+    if not intro_video.exists() or missing:
+        for path in ([] if intro_video.exists() else [intro_video]) + missing:
+            typer.echo(f"❌ Video not found at {path}")
+        raise typer.Exit(1)
+    # Decide output names up front: concurrent episodes must never share a file
+    output_paths = combined_output_paths(main_videos, output_dir)
+    
+    # Probe every main video once and group by what the intro has to match
+    typer.echo(f"📊 Analyzing {len(main_videos)} main videos...")
+    probe_seconds, results = {}, {}
+    def probe(video):
+        started = time.time()
+        try:
+            settings = probe_main_video(video)
+        except subprocess.CalledProcessError:
+            settings, error = None, "ffprobe can't read this file"
+        except StopIteration:
+            settings, error = None, "no video stream"
+        except Exception as e:
+            settings, error = None, f"can't read stream settings: {str(e) or type(e).__name__}"
+        probe_seconds[video] = time.time() - started
+        if settings is None:
+            results[video] = (None, False, probe_seconds[video], error)
+            typer.echo(f"❌ {video.name}: {error}")
+        return settings
+    with ThreadPoolExecutor(max_workers=min(cores, 8)) as pool:
+        all_settings = {video: settings for video, settings in zip(main_videos, pool.map(probe, main_videos))
+                        if settings is not None}
+    
+    def signature(settings):
+        if stream_copy and not stream_copy_blockers(settings):
+            return json.dumps(settings, sort_keys=True)
+        # A re-encode reads only the prescaled intro's frame size from the group;
+        # audio is resampled per episode
+        return json.dumps({"width": settings["width"], "height": settings["height"]}, sort_keys=True)
+    groups = {}
+    for video, settings in all_settings.items():
+        groups.setdefault(signature(settings), []).append(video)
+    
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # Prepared intros go next to the outputs, not in tmpfs: a prescaled FFV1 intro is
+    # hundreds of MB at 1080p
+    with tempfile.TemporaryDirectory(prefix=".batch-", dir=output_dir) as scratch_dir:
+        scratch_dir = Path(scratch_dir)
+        # Prepare the intro once per group; groups that fall back from stream copy
+        # share a prescaled intro with any other group of the same frame size
+        prepared, prescaled_by_size = {}, {}
+        for index, (group_signature, videos) in enumerate(groups.items()):
+            settings = all_settings[videos[0]]
+            group_copy = stream_copy and not stream_copy_blockers(settings)
+            label = settings_label(settings) if group_copy else f"{settings['width']}x{settings['height']}, re-encoded"
+            typer.echo(f"🗂️ Group {index + 1}: {label} ({len(videos)} episodes)")
+            if stream_copy and not group_copy:
+                typer.echo(f"   ⚠️ Re-encoding this group: {'; '.join(stream_copy_blockers(settings))}")
+            conformed, prescaled = None, None
+            started = time.time()
+            if group_copy:
+                conformed = scratch_dir / f"intro_group{index + 1}.mp4"
+                conform_intro(intro_video, settings, conformed, cores)
+                typer.echo(f"   🎞️ Conformed intro in {time.time() - started:.1f}s")
+                mismatch = parameter_set_mismatch(conformed, settings)
+                if mismatch:
+                    typer.echo(f"   ⚠️ Re-encoding this group: {mismatch}")
+                    group_copy, conformed = False, None
+            if not group_copy:
+                size = (settings["width"], settings["height"])
+                if size not in prescaled_by_size:
+                    # NUT keeps the intro's own timestamps, so frames come out as they went in
+                    prescaled_by_size[size] = scratch_dir / f"intro_{size[0]}x{size[1]}.nut"
+                    prescale_intro(intro_video, settings, prescaled_by_size[size], cores)
+                    typer.echo(f"   🎞️ Prescaled intro in {time.time() - started:.1f}s")
+                prescaled = prescaled_by_size[size]
+            prepared[group_signature] = (index + 1, group_copy, conformed, prescaled, time.time() - started)
+        
+        def run_episode(video, threads=None):
+            group, group_copy, conformed, prescaled, _ = prepared[signature(all_settings[video])]
+            output_path = output_paths[video]
+            started = time.time()
+            try:
+                timings = combine_videos(intro_video, video, output_path, transition_duration, fragmented,
+                                         stream_copy=group_copy, settings=all_settings[video], conformed_intro=conformed,
+                                         threads=threads, quiet=True, prescaled_intro=prescaled)
+                group_copy, error = timings["stream_copy"], None
+            except subprocess.CalledProcessError as e:
+                error = (e.stderr.decode(errors="replace").strip().splitlines() or ["ffmpeg failed"])[-1]
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            results[video] = (group, group_copy, time.time() - started, error)
+            typer.echo(f"{'❌' if error else '✅'} {video.name} -> {output_path}" + (f": {error}" if error else ""))
         
+        # Big groups first so the core budget stays busy at the tail
+        ordered = [video for videos in sorted(groups.values(), key=len, reverse=True) for video in videos]
+        copy_jobs = [v for v in ordered if prepared[signature(all_settings[v])][1]]
+        encode_jobs = [v for v in ordered if v not in copy_jobs]
+        if copy_jobs:
+            with ThreadPoolExecutor(max_workers=min(cores, len(copy_jobs))) as pool:
+                list(pool.map(run_episode, copy_jobs))
+        if encode_jobs:
+            with ThreadPoolExecutor(max_workers=max(1, min(len(encode_jobs), cores // threads_per_job))) as pool:
+                list(pool.map(lambda video: run_episode(video, threads_per_job), encode_jobs))
+    
+    wall = time.time() - batch_started
+    # One combine per episode would re-probe and re-prepare the intro every time. Episode
+    # times were measured while sharing cores, so this is an upper bound
+    sequential = sum(
+        probe_seconds[video] + prepared[group_signature][4] + results[video][2]
+        for group_signature, videos in groups.items() for video in videos
+    )
+    
+    typer.echo(f"\n{'episode':<32} {'group':>5} {'mode':<12} {'time':>8}  status")
+    for video in main_videos:
+        group, group_copy, seconds, error = results[video]
+        mode = '-' if group is None else 'stream-copy' if group_copy else 're-encode'
+        typer.echo(f"{str(video)[-32:]:<32} {group or '-':>5} {mode:<12} "
+                   f"{seconds:>7.1f}s  {'FAILED: ' + error if error else 'ok'}")
+    typer.echo(f"\n⏱️ Batch wall time: {wall:.1f}s for {len(main_videos)} episodes in {len(groups)} groups")
+    typer.echo(f"📉 Sequential combine runs: at most ~{sequential:.1f}s "
+               f"(saved up to ~{sequential - wall:.1f}s, {sequential / wall:.1f}x; "
+               f"episode times include contention from running concurrently)")
+    return not any(error for *_, error in results.values())
+
+@app.command()
+def combine(
+    intro_video: Path = typer.Option(..., help="Path to intro video"),
+    main_video: Path = typer.Option(None, help="Path to main content video"),
+    output_path: Path = typer.Option("combined.mp4", help="Path to save combined video ('-' for stdout, or a FIFO)"),
+    transition_duration: float = typer.Option(0.8, help="Cross-fade transition duration in seconds"),
+    fragmented: bool = typer.Option(False, "--fragmented", help="Write fragmented MP4 that can be read while it is being written"),
+    stream_copy: bool = typer.Option(False, "--stream-copy", help="Conform the intro to the main video and copy the main video instead of re-encoding it"),
+    measure: bool = typer.Option(False, "--measure", help="Report time to first playable byte and total wall time"),
+    batch: Path = typer.Option(None, help="Text file listing main videos, one per line; outputs go to --output-dir"),
+    output_dir: Path = typer.Option("output", help="Where --batch writes <main video name>_combined.mp4"),
+    cores: int = typer.Option(None, help="Core budget shared by concurrent --batch episodes (default: all)"),
+    threads_per_job: int = typer.Option(4, help="Encoder threads per re-encoded --batch episode"),
+):
+    """
+    Combine intro video with main content video, matching main video's settings
+    """
+    if batch is not None:
+        main_videos = [
+            Path(line.strip()) for line in batch.read_text().splitlines()
+            if line.strip() and not line.strip().startswith("#")
+        ]
+        if not combine_batch(intro_video, main_videos, output_dir, transition_duration, fragmented,
+                             stream_copy, cores, threads_per_job):
+            raise typer.Exit(1)
+        return
+    
+    if main_video is None:
+        raise typer.BadParameter("Pass --main-video, or --batch with a list of main videos")
+    combine_videos(intro_video, main_video, output_path, transition_duration, fragmented, stream_copy, measure)
+
+@app.command()
+def bench_combine(
+    intro_video: Path = typer.Option(..., help="Path to intro video"),
+    main_video: Path = typer.Option(..., help="Path to main content video"),
+    output_dir: Path = typer.Option("output", help="Directory whose disk the benchmark outputs are written to"),
+):
+    """
+    Compare time to first playable byte and wall time of faststart vs fragmented output
+    """
+    modes = [
+        ("re-encode + faststart (current)", False, False),
+        ("re-encode + fragmented", False, True),
+    ]
+    if not stream_copy_blockers(main_video_settings(probe_media(main_video))):
+        modes += [
+            ("stream-copy + faststart", True, False),
+            ("stream-copy + fragmented", True, True),
+        ]
+    
+    rows = []
+    # Next to the real outputs, not in tmpfs: the faststart rewrite is disk I/O, and
+    # full-length outputs would sit in RAM
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="bench-", dir=output_dir) as bench_dir:
+        for i, (label, stream_copy, fragmented) in enumerate(modes):
+            typer.echo(f"\n⏱️ {label}")
+            bench_output = Path(bench_dir) / f"bench_{i}.mp4"
+            timings = combine_videos(intro_video, main_video, bench_output,
+                                     stream_copy=stream_copy, fragmented=fragmented)
+            bench_output.unlink()
+            if stream_copy and not timings["stream_copy"]:
+                label = label.replace("stream-copy", "re-encode (fallback)")
+            rows.append((label, timings))
+    
+    baseline = rows[0][1]
+    typer.echo(f"\n{'mode':<34} {'first byte':>10} {'total':>8} {'vs current':>11}")
+    for label, timings in rows:
+        first = timings["first_playable"]
+        first_text = "n/a" if first is None else f"{first:.2f}s"
+        typer.echo(f"{label:<34} {first_text:>10} {timings['wall']:>7.2f}s {baseline['wall'] / timings['wall']:>10.2f}x")
+
+# ---------------------------------------------------------------------------
+# One-shot publish: composite straight into the combine stage
+# ---------------------------------------------------------------------------
+
+def publish_video(background_path: Path, face_image_path: Path, title: str, footer: str, main_video: Path,
+                  output_path: Path, fragmented: bool = False, stream_copy: bool = True,
+                  use_mezzanine: bool = True, measure: bool = False, mezzanine_dir: Path = MEZZANINE_DIR) -> dict:
+    """Composite the intro and join it onto the main video, encoding the intro once.
+    
+    When the main video can be stream-copied, the composite filtergraph is encoded
+    straight into the main video's stream parameters as a scratch intro, which a
+    second ffmpeg joins by stream copy; otherwise a single ffmpeg process composites,
+    concats and encodes everything. Returns the ffmpeg timings.
+    """
+    to_stdout = str(output_path) == '-'
+    say = lambda message: typer.echo(message, err=to_stdout)
+    
+    for path, what in ((background_path, "Background video"), (face_image_path, "Reference image"),
+                       (main_video, "Main video")):
+        if not path.exists():
+            say(f"❌ {what} not found at {path}")
+            raise typer.Exit(1)
+    
+    if not fragmented and (to_stdout or is_fifo(output_path)):
+        say("📡 Pipes and FIFOs can't be rewritten for faststart; writing fragmented MP4")
+        fragmented = True
+    
+    say("📊 Analyzing main video settings...")
+    settings = probe_main_video(main_video)
+    say(f"📺 Main video: {settings_label(settings)}")
+    if stream_copy and stream_copy_blockers(settings):
+        say(f"⚠️ Can't stream-copy main video ({'; '.join(stream_copy_blockers(settings))}); re-encoding instead")
+        stream_copy = False
+    
+    started = time.time()
+    background_width, background_height = probe_video_size(background_path)
+    face_overlay = build_face_overlay(face_image_path, background_width, background_height).tobytes()
+    composite = composite_filter_graph(title, footer, background_width, background_height, output_label="composited")
+    # Keep stdout clean when it carries the video
+    with redirect_stdout(sys.stderr) if to_stdout else nullcontext():
+        background_args, audio_args, audio_map = background_inputs(background_path, use_mezzanine, mezzanine_dir)
+    inputs = [*background_args, *overlay_pipe_args(background_width, background_height), *audio_args]
+    watch_path = None if to_stdout or is_fifo(output_path) else output_path
+    
+    try:
+        if stream_copy:
+            with job_scratch("publish-") as scratch_dir:
+                # Most main videos weren't made by default-settings x264; find out from one
+                # background frame instead of compositing an intro only to throw it away
+                mismatch = predict_parameter_set_mismatch(background_args, settings, scratch_dir)
+                if not mismatch:
+                    say("🎬 Compositing intro directly in the main video's stream settings...")
+                    intro_path = scratch_dir / "intro.mp4"
+                    cmd = [
+                        'ffmpeg', '-y', *inputs,
+                        '-filter_complex', f"{composite};[composited]{conform_filter(settings)}[intro_v]",
+                        '-map', '[intro_v]',
+                        '-map', audio_map,
+                        *conformed_intro_args(settings),
+                        str(intro_path)
+                    ]
+                    run_ffmpeg_timed(cmd, started=started, input=face_overlay)
+                    # What gets copied is the real intro, so it has the last word
+                    mismatch = parameter_set_mismatch(intro_path, settings)
+                if mismatch:
+                    say(f"⚠️ Can't stream-copy main video ({mismatch}); re-encoding instead")
+                    stream_copy = False
+                else:
+                    say("🔗 Joining intro and main video by stream copy...")
+                    cmd = concat_copy_cmd(intro_path, main_video, scratch_dir / "concat.txt", output_path, fragmented)
+                    timings = run_ffmpeg_timed(cmd, watch_path, started)
+        if not stream_copy:
+            # Same join as `combine`, fed by the composite graph instead of a decoded intro.mp4
+            main_index = 2 + (1 if audio_args else 0)
+            say("🎬 Compositing, joining and encoding in one pass...")
+            cmd = [
+                'ffmpeg', '-y', *inputs,
+                '-i', str(main_video),
+                '-filter_complex', ";".join([
+                    composite,
+                    f"[composited]trim=end=8,fps={settings['frame_rate']}[composited_intro]",
+                    reencode_join_graph("composited_intro", audio_map, main_index, settings),
+                ]),
+                *reencode_join_args(settings),
+                *output_args(output_path, fragmented)
+            ]
+            timings = run_ffmpeg_timed(cmd, watch_path, started, input=face_overlay)
     except subprocess.CalledProcessError as e:
-        typer.echo(f"❌ FFmpeg error: {e.stderr.decode()}")
+        say(f"❌ FFmpeg error: {e.stderr.decode()}")
         raise
+    
+    timings["stream_copy"] = stream_copy
+    say(f"✅ Published video saved to {'stdout' if to_stdout else output_path}")
+    if measure:
+        first = timings["first_playable"]
+        say(f"⏱️ Time to first playable byte: {'n/a' if first is None else f'{first:.2f}s'}, "
+            f"total: {timings['wall']:.2f}s")
+    return timings
+
+@app.command()
+def publish(
+    title: str = typer.Option(..., help="Main title text"),
+    footer: str = typer.Option(..., help="Footer handle or link (e.g., '@user / site.com')"),
+    reference_image: Path = typer.Option(..., help="Reference face image path"),
+    main_video: Path = typer.Option(..., help="Path to main content video"),
+    background_video: Path = typer.Option("cache/background.mp4", help="Path to cached background video"),
+    output_path: Path = typer.Option("combined.mp4", help="Path to save the published video ('-' for stdout, or a FIFO)"),
+    fragmented: bool = typer.Option(False, "--fragmented", help="Write fragmented MP4 that can be read while it is being written"),
+    stream_copy: bool = typer.Option(True, help="Copy the main video's streams when its codecs allow it"),
+    mezzanine: bool = typer.Option(True, help="Read the background from a decoded-frame cache instead of decoding H.264 each time"),
+    measure: bool = typer.Option(False, "--measure", help="Report time to first playable byte and total wall time"),
+):
+    """
+    Render the intro and put it in front of the main video in one step, encoding the intro once
+    """
+    publish_video(background_video, reference_image, title, footer, main_video, output_path,
+                  fragmented, stream_copy, mezzanine, measure)
+
+@app.command()
+def verify_equivalence(
+    case: Optional[List[str]] = typer.Option(None, help="Case to run (repeatable; default: all)"),
+    update_golden: bool = typer.Option(False, "--update-golden", help="Re-render fixtures and goldens with the current pipeline first"),
+    golden_dir: Path = typer.Option("cache/golden", help="Where golden outputs and fixtures live"),
+    report_dir: Path = typer.Option("cache/equivalence_report", help="Where per-frame reports are written"),
+):
+    """
+    Check that render paths still match the golden composite and combine outputs
+    """
+    import equivalence
+    
+    if update_golden:
+        equivalence.update_goldens(golden_dir)
+    if not equivalence.run_harness(case, golden_dir, report_dir):
+        raise typer.Exit(1)
+
+# ---------------------------------------------------------------------------
+# Incremental build graph
+# ---------------------------------------------------------------------------
+
+BUILD_MANIFEST = Path("cache/build_manifest.json")
+
+_digest_memo = {}
+_digest_lock = threading.Lock()
+
+def file_digest(path: Path) -> str:
+    """Return the sha256 of a file's contents, memoized on path, size and mtime."""
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        if memo_key in _digest_memo:
+            return _digest_memo[memo_key]
+    
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    
+    with _digest_lock:
+        _digest_memo[memo_key] = digest.hexdigest()
+    return digest.hexdigest()
+
+@lru_cache(maxsize=None)
+def tool_versions() -> dict:
+    """Versions of the tools that shape our outputs; a change invalidates every artifact."""
+    import numpy as np
+    versions = {"pillow": PIL.__version__, "numpy": np.__version__}
+    try:
+        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, check=True)
+        versions["ffmpeg"] = result.stdout.splitlines()[0]
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        versions["ffmpeg"] = "unavailable"
+    return versions
+
+@dataclass
+class Stage:
+    """One artifact in the build graph and the recipe that produces it."""
+    name: str
+    output: Path
+    run: Callable[[], None]
+    inputs: dict = field(default_factory=dict)  # label -> Path
+    params: dict = field(default_factory=dict)
+    tools: tuple = ("ffmpeg", "pillow", "numpy")
+    # Trust an existing output that has no build record instead of rebuilding it
+    # (used for the background, which costs API credits to regenerate).
+    adopt_existing: bool = False
+
+    def fingerprint(self) -> dict:
+        versions = tool_versions()
+        return {
+            "inputs": {label: file_digest(path) for label, path in self.inputs.items()},
+            "params": self.params,
+            "tools": {tool: versions[tool] for tool in self.tools},
+        }
+
+def known_digests() -> dict:
+    """Memoized digests of files that are still unchanged on disk, for the manifest."""
+    with _digest_lock:
+        entries = list(_digest_memo.items())
+    known = {}
+    for (path, size, mtime_ns), digest in entries:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns):
+            known[path] = {"size": size, "mtime_ns": mtime_ns, "sha256": digest}
+    return known
+
+def load_build_manifest(manifest_path: Path = BUILD_MANIFEST) -> dict:
+    """Load the per-output build records and seed file_digest with the recorded digests.
+    
+    Files whose size and mtime still match are not re-hashed, so an up-to-date build
+    doesn't read every multi-GB main video again.
+    """
+    if not manifest_path.exists():
+        return {}
+    try:
+        data = json.loads(manifest_path.read_text())
+    except json.JSONDecodeError:
+        typer.echo(f"⚠️ Ignoring unreadable build manifest at {manifest_path}")
+        return {}
+    if "stages" not in data:
+        return data  # Older manifests hold only the build records
+    with _digest_lock:
+        for path, entry in data.get("digests", {}).items():
+            _digest_memo[(path, entry["size"], entry["mtime_ns"])] = entry["sha256"]
+    return data["stages"]
+
+def save_build_manifest(manifest: dict, manifest_path: Path = BUILD_MANIFEST):
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"stages": manifest, "digests": known_digests()}, indent=2, sort_keys=True))
+    os.replace(tmp_path, manifest_path)
+
+def stage_dependencies(stage: Stage, stages: List[Stage]) -> List[Stage]:
+    """Stages whose output is one of this stage's inputs."""
+    inputs = {path.resolve() for path in stage.inputs.values()}
+    return [other for other in stages if other is not stage and other.output.resolve() in inputs]
+
+def build_record(stage: Stage) -> dict:
+    """Manifest entry for a freshly built (or adopted) output: its fingerprint and its own digest."""
+    return dict(stage.fingerprint(), output=file_digest(stage.output))
+
+def stale_reasons(stage: Stage, manifest: dict, upstream_stale: List[str]) -> List[str]:
+    """Explain why a stage needs rebuilding; an empty list means it is up to date."""
+    if upstream_stale:
+        return [f"upstream '{name}' will be rebuilt" for name in upstream_stale]
+    
+    missing = [label for label, path in stage.inputs.items() if not path.exists()]
+    if missing:
+        return [f"input {label} is missing"]
+    
+    if not stage.output.exists():
+        return ["output missing"]
+    
+    recorded = manifest.get(str(stage.output))
+    if recorded is None:
+        return [] if stage.adopt_existing else ["no build record"]
+    
+    # Adopted outputs are replaced by hand on purpose; run_build re-adopts them
+    if recorded.get("output") != file_digest(stage.output) and not stage.adopt_existing:
+        return ["output changed since it was built"]
+    
+    current = stage.fingerprint()
+    reasons = []
+    for section, singular in (("inputs", "input"), ("params", "param"), ("tools", "tool")):
+        old, new = recorded.get(section, {}), current[section]
+        for key in sorted(set(old) | set(new)):
+            if old.get(key) != new.get(key):
+                reasons.append(f"{singular} {key} changed")
+    return reasons
+
+def run_build(stages: List[Stage], jobs: int = 1, dry_run: bool = False,
+              manifest_path: Path = BUILD_MANIFEST) -> bool:
+    """Rebuild stale stages Make-style, running independent ones in parallel.
+    
+    Stages must be listed in dependency order. Returns False if any stage failed.
+    """
+    manifest = load_build_manifest(manifest_path)
+    deps = {stage.name: stage_dependencies(stage, stages) for stage in stages}
+    
+    # Plan: a stage is stale if its own fingerprint changed or anything upstream is stale
+    planned, adopted = set(), []
+    for stage in stages:
+        upstream = [dep.name for dep in deps[stage.name] if dep.name in planned]
+        reasons = stale_reasons(stage, manifest, upstream)
+        if reasons:
+            planned.add(stage.name)
+            typer.echo(f"🔨 {stage.name}: {'; '.join(reasons)}")
+        elif manifest.get(str(stage.output), {}).get("output") != file_digest(stage.output):
+            adopted.append(stage)
+            typer.echo(f"📥 {stage.name}: adopting existing {stage.output}")
+        else:
+            typer.echo(f"✅ {stage.name}: up to date ({stage.output})")
+    
+    if not dry_run:
+        # Record what adopted outputs were built from, so later param changes show, and
+        # keep this run's file digests so the next run needn't re-hash unchanged files
+        for stage in adopted:
+            manifest[str(stage.output)] = build_record(stage)
+        save_build_manifest(manifest, manifest_path)
+    
+    if dry_run or not planned:
+        if not planned:
+            typer.echo("✨ Nothing to rebuild")
+        return True
+    
+    manifest_lock = threading.Lock()
+    done, failed = set(), set()
+    
+    def build_stage(stage: Stage) -> None:
+        # Re-check now that upstream outputs exist: an upstream rebuild that produced
+        # identical content leaves this stage fresh (early cutoff).
+        reasons = stale_reasons(stage, manifest, [])
+        if not reasons:
+            typer.echo(f"⏭️ {stage.name}: unchanged after upstream rebuild, skipping")
+        else:
+            typer.echo(f"🔨 Building {stage.name}...")
+            stage.output.parent.mkdir(parents=True, exist_ok=True)
+            stage.run()
+        record = build_record(stage)
+        with manifest_lock:
+            manifest[str(stage.output)] = record
+            save_build_manifest(manifest, manifest_path)
+    
+    pending = [stage for stage in stages if stage.name in planned]
+    done.update(stage.name for stage in stages if stage.name not in planned)
+    running = {}
+    
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            for stage in list(pending):
+                dep_names = [dep.name for dep in deps[stage.name]]
+                if any(name in failed for name in dep_names):
+                    typer.echo(f"⛔ {stage.name}: skipped because an upstream stage failed")
+                    failed.add(stage.name)
+                    pending.remove(stage)
+                elif all(name in done for name in dep_names):
+                    running[pool.submit(build_stage, stage)] = stage
+                    pending.remove(stage)
+            
+            if not running:
+                continue
+            
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                try:
+                    future.result()
+                    done.add(stage.name)
+                except Exception as e:
+                    typer.echo(f"❌ {stage.name} failed: {e}")
+                    failed.add(stage.name)
+    
+    return not failed
+
+def combined_output_paths(main_videos: List[Path], output_dir: Path) -> dict:
+    """Map each main video to <name>_combined.mp4 in output_dir, without two sharing a file.
+    
+    Videos that share a file name (s1/ep01.mp4, s2/ep01.mp4) get as many of their
+    parent directory names prepended as it takes to tell them apart.
+    """
+    resolved = {video: video.resolve() for video in main_videos}
+    resolved_list = [resolved[video] for video in main_videos]
+    repeated = sorted({str(video) for video in main_videos if resolved_list.count(resolved[video]) > 1})
+    if repeated:
+        raise typer.BadParameter(f"Main video listed more than once: {', '.join(repeated)}")
+    
+    names = {video: video.stem for video in main_videos}
+    depth = 0
+    while True:
+        clashing = [video for video in main_videos if list(names.values()).count(names[video]) > 1]
+        if not clashing:
+            break
+        depth += 1
+        for video in clashing:
+            parents = resolved[video].parent.parts[1:][-depth:]  # Skip the root
+            names[video] = "_".join((*parents, video.stem))
+        if depth > max(len(resolved[video].parts) for video in clashing):
+            raise typer.BadParameter(f"Can't give distinct output names to: {', '.join(map(str, clashing))}")
+    return {video: output_dir / f"{names[video]}_combined.mp4" for video in main_videos}
+
+@app.command()
+def build(
+    title: str = typer.Option(..., help="Main title text"),
+    footer: str = typer.Option(..., help="Footer handle or link (e.g., '@user / site.com')"),
+    reference_image: Path = typer.Option(..., help="Reference face image path"),
+    main_video: Optional[List[Path]] = typer.Option(None, help="Main content video to prepend the intro to (repeatable)"),
+    background_video: Path = typer.Option("cache/background.mp4", help="Path to cached background video"),
+    output_dir: Path = typer.Option("output", help="Directory for the intro and combined videos"),
+    transition_duration: float = typer.Option(0.8, help="Cross-fade transition duration in seconds"),
+    api_key: str = typer.Option(None, "--api-key", "-k", help="fal.ai API key (only needed if the background must be generated)"),
+    jobs: int = typer.Option(os.cpu_count() or 1, "--jobs", "-j", help="Maximum stages to run in parallel"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Show what would be rebuilt and why, without building"),
+):
+    """
+    Rebuild only the stale parts of background -> intro -> combined videos
+    """
+    intro_path = output_dir / "intro.mp4"
+    
+    stages = [
+        Stage(
+            name="background",
+            output=background_video,
+            run=lambda: generate_background(api_key, background_video),
+            params=dict(BACKGROUND_PAYLOAD, prompt=BACKGROUND_PROMPT.strip()),
+            tools=(),
+            adopt_existing=True,
+        ),
+        Stage(
+            name="intro",
+            output=intro_path,
+            run=lambda: composite_video(background_video, reference_image, title, footer, intro_path),
+            inputs={"background": background_video, "reference_image": reference_image},
+            params={"title": title, "footer": footer},
+        ),
+    ]
+    
+    for video, combined_path in combined_output_paths(main_video or [], output_dir).items():
+        stages.append(Stage(
+            name=f"combine:{combined_path.stem[:-len('_combined')]}{video.suffix}",
+            output=combined_path,
+            run=lambda video=video, combined_path=combined_path: combine_videos(
+                intro_path, video, combined_path, transition_duration),
+            inputs={"intro": intro_path, "main_video": video},
+            params={"transition_duration": transition_duration},
+        ))
+    
+    if not run_build(stages, jobs=jobs, dry_run=dry_run):
+        raise typer.Exit(1)
+
+
+# ---------------------------------------------------------------------------
+# Render farm (queue lives in farm.py)
+# ---------------------------------------------------------------------------
+
+@app.command()
+def farm_submit(
+    kind: str = typer.Argument(..., help="Job type: 'main' or 'combine'"),
+    title: str = typer.Option(None, help="Main title text (main jobs)"),
+    footer: str = typer.Option(None, help="Footer handle or link (main jobs)"),
+    reference_image: Path = typer.Option(None, help="Reference face image path (main jobs)"),
+    background_video: Path = typer.Option("cache/background.mp4", help="Path to cached background video (main jobs)"),
+    intro_video: Path = typer.Option(None, help="Path to intro video (combine jobs)"),
+    main_video: Path = typer.Option(None, help="Path to main content video (combine jobs)"),
+    output_path: Path = typer.Option(..., help="Where the worker should save the result"),
+    transition_duration: float = typer.Option(0.8, help="Cross-fade transition duration in seconds (combine jobs)"),
+    min_cores: int = typer.Option(None, help="Only run on workers with at least this many cores (default: 1 for main, 8 for combine)"),
+    max_attempts: int = typer.Option(3, help="Give up after this many failed or abandoned attempts"),
+    queue: Path = typer.Option(None, help="Queue database on a shared filesystem (default: $INTRO_FARM_DB or cache/farm.db)"),
+):
+    """
+    Queue a main or combine job for the render farm
+    """
+    import farm
+    
+    # Paths are stored absolute so workers on other hosts resolve them on the shared filesystem
+    if kind == "main":
+        if not (title and footer and reference_image):
+            raise typer.BadParameter("main jobs need --title, --footer and --reference-image")
+        params = {
+            "title": title, "footer": footer,
+            "reference_image": str(reference_image.resolve()),
+            "background_video": str(background_video.resolve()),
+            "output_path": str(output_path.resolve()),
+        }
+        default_cores = 1
+    elif kind == "combine":
+        if not (intro_video and main_video):
+            raise typer.BadParameter("combine jobs need --intro-video and --main-video")
+        params = {
+            "intro_video": str(intro_video.resolve()),
+            "main_video": str(main_video.resolve()),
+            "output_path": str(output_path.resolve()),
+            "transition_duration": transition_duration,
+        }
+        default_cores = farm.COMBINE_MIN_CORES
+    else:
+        raise typer.BadParameter(f"Unknown job kind '{kind}' (expected 'main' or 'combine')")
+    
+    conn = farm.connect(queue or farm.DEFAULT_DB)
+    # A combine whose intro is still being rendered by the farm waits for that job
+    depends_on = farm.producer_of(conn, params["intro_video"]) if kind == "combine" else None
+    job_id = farm.submit_job(conn, kind, params, min_cores or default_cores, max_attempts, depends_on)
+    typer.echo(f"📥 Queued {kind} job {job_id} -> {output_path}"
+               + (f" (after job {depends_on})" if depends_on else ""))
+
+@app.command()
+def farm_worker(
+    queue: Path = typer.Option(None, help="Queue database on a shared filesystem (default: $INTRO_FARM_DB or cache/farm.db)"),
+    cores: int = typer.Option(None, help="Core count to advertise (default: this machine's)"),
+    exit_when_idle: bool = typer.Option(False, help="Exit once the queue is empty instead of polling forever"),
+):
+    """
+    Run a render farm worker that pulls main and combine jobs from the queue
+    """
+    import farm
+    farm.run_worker(queue or farm.DEFAULT_DB, cores=cores, exit_when_idle=exit_when_idle)
+
+@app.command()
+def farm_stats(
+    queue: Path = typer.Option(None, help="Queue database on a shared filesystem (default: $INTRO_FARM_DB or cache/farm.db)"),
+    window: float = typer.Option(300, help="Throughput window in seconds"),
+):
+    """
+    Show render farm queue depth, throughput and workers
+    """
+    import farm
+    farm.print_stats(farm.queue_stats(farm.connect(queue or farm.DEFAULT_DB), window))
+
+@app.command()
+def farm_simulate(
+    workers: str = typer.Option("2,4,8", help="Comma-separated core counts, one simulated node each"),
+    jobs: int = typer.Option(12, help="Number of synthetic jobs to queue"),
+    job_seconds: float = typer.Option(1.0, help="Duration of a small synthetic job"),
+    kill_after: float = typer.Option(None, help="Kill the first node after this many seconds to exercise retries"),
+    queue: Path = typer.Option("cache/farm_simulation.db", help="Scratch queue database for the simulation"),
+):
+    """
+    Simulate several farm nodes locally with synthetic jobs
+    """
+    import farm
+    farm.simulate(queue, [int(c) for c in workers.split(",")], jobs, job_seconds, kill_after)
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -0,0 +1,562 @@
+"""Output-equivalence harness: guards faster render paths against today's outputs.
+
+Golden outputs are rendered once from synthetic `lavfi` inputs and a generated face
+fixture, using frozen copies of the baseline `composite_video` and `combine` ffmpeg
+recipes. Each case then renders the same inputs through a candidate path and compares
+it with its golden: per-frame Y/U/V PSNR/SSIM (vectorized over frames), exact audio
+samples, audio alignment across the intro/main join, A/V start offsets and stream
+parameters, including profile, level and colour tags. Failing cases get a per-frame
+CSV and a diff image of the worst frame.
+"""
+import csv
+import json
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import typer
+from PIL import Image, ImageDraw
+
+GOLDEN_DIR = Path("cache/golden")
+REPORT_DIR = Path("cache/equivalence_report")
+
+# Small and short so the whole harness runs in seconds
+FIXTURE_SIZE = (320, 180)
+MAIN_SIZE = (640, 360)
+TITLE = "Equivalence Harness Title That Wraps Onto Two Lines"
+FOOTER = "@harness / example.com"
+
+# Seeded noise, not a tone: a periodic signal cross-correlates equally well at every
+# multiple of its period, so a shift at the intro/main join couldn't be measured
+MAIN_AUDIO = 'anoisesrc=color=pink:seed=7:amplitude=0.3:sample_rate=44100:duration=3'
+# Where the main video starts in every combine/publish output
+JOIN_SECONDS = 8.0
+
+STREAM_KEYS = ("codec_type", "codec_name", "profile", "level", "width", "height", "pix_fmt", "r_frame_rate",
+               "color_range", "color_space", "color_transfer", "color_primaries",
+               "sample_rate", "channels", "channel_layout")
+
+def run_ffmpeg(args: list, **kwargs) -> subprocess.CompletedProcess:
+    return subprocess.run(['ffmpeg', '-y', '-v', 'error', *args], check=True, capture_output=True, **kwargs)
+
+def make_fixtures(fixture_dir: Path) -> dict:
+    """Synthesize the background, main video and face image the goldens are rendered from."""
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+    width, height = FIXTURE_SIZE
+    main_width, main_height = MAIN_SIZE
+    fixtures = {
+        "background": fixture_dir / "background.mp4",
+        "main": fixture_dir / "main.mp4",
+        "main-x264": fixture_dir / "main_x264.mp4",
+        "face": fixture_dir / "face.png",
+    }
+
+    # Colour-tagged like real footage, so a path that drops the tags shows up
+    run_ffmpeg([
+        '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate=24:duration=8',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000:duration=8',
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-color_primaries', 'bt709', '-color_trc', 'bt709',
+        '-colorspace', 'bt709', '-color_range', 'tv',
+        '-c:a', 'aac', '-ac', '2', '-shortest',
+        str(fixtures["background"]),
+    ])
+    # Main video differs in size and audio from the intro. It shares the intro's frame
+    # rate: combine's concat filter cannot mix rates. It is tagged like the background:
+    # with different tags the intro's SPS colour description couldn't match, and the
+    # stream-copy cases would only test the fallback.
+    run_ffmpeg([
+        '-f', 'lavfi', '-i', f'testsrc=size={main_width}x{main_height}:rate=24:duration=3',
+        '-f', 'lavfi', '-i', MAIN_AUDIO,
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-color_primaries', 'bt709', '-color_trc', 'bt709',
+        '-colorspace', 'bt709', '-color_range', 'tv',
+        '-c:a', 'aac', '-ac', '2', '-shortest',
+        str(fixtures["main"]),
+    ])
+    # Same pictures from an encoder configured unlike the intro's (level, refs, CAVLC),
+    # as camera and screen-recorder files are: its SPS/PPS differ
+    run_ffmpeg([
+        '-f', 'lavfi', '-i', f'testsrc=size={main_width}x{main_height}:rate=24:duration=3',
+        '-f', 'lavfi', '-i', MAIN_AUDIO,
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-profile:v', 'high', '-level', '4.1',
+        '-refs', '2', '-coder', '0', '-color_primaries', 'bt709', '-color_trc', 'bt709',
+        '-colorspace', 'bt709', '-color_range', 'tv',
+        '-c:a', 'aac', '-ac', '2', '-shortest',
+        str(fixtures["main-x264"]),
+    ])
+
+    # A gray "face" on white, so the white-background removal has work to do
+    face = Image.new('RGB', (256, 256), (255, 255, 255))
+    draw = ImageDraw.Draw(face)
+    draw.ellipse((48, 24, 208, 232), fill=(150, 150, 150))
+    draw.ellipse((88, 96, 112, 120), fill=(30, 30, 30))
+    draw.ellipse((144, 96, 168, 120), fill=(30, 30, 30))
+    draw.rectangle((100, 170, 156, 182), fill=(60, 60, 60))
+    face.save(fixtures["face"])
+    return fixtures
+
+def fixture_paths(golden_dir: Path) -> dict:
+    fixture_dir = golden_dir / "fixtures"
+    return {
+        "background": fixture_dir / "background.mp4",
+        "main": fixture_dir / "main.mp4",
+        "main-x264": fixture_dir / "main_x264.mp4",
+        "face": fixture_dir / "face.png",
+    }
+
+# ---------------------------------------------------------------------------
+# Frozen baseline recipes
+#
+# Verbatim copies of the ffmpeg invocations `composite_video` and `combine` used
+# before any render-path optimisation (only the overlay PNG moved from the working
+# directory to a temp dir). Goldens come from these, never from cli.py, so a change
+# to cli.py can't silently move the reference along with it. Do not edit.
+# ---------------------------------------------------------------------------
+
+def baseline_composite(background_path: Path, face_image_path: Path, title: str, footer: str, output_path: Path):
+    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_streams', str(background_path)]
+    data = json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)
+    video_stream = next(s for s in data['streams'] if s['codec_type'] == 'video')
+    width, height = int(video_stream['width']), int(video_stream['height'])
+
+    img_array = np.array(Image.open(face_image_path).convert('RGBA'))
+    background_mask = (img_array[:, :, 0] > 250) & (img_array[:, :, 1] > 250) & (img_array[:, :, 2] > 250)
+    img_array[background_mask, 3] = 0
+    r, g, b, a = Image.fromarray(img_array).split()
+    face_img = Image.merge('LA', (r.convert('L'), a)).convert('RGBA')
+    face_size = int(width * 0.3)
+    face_img = face_img.resize((face_size, face_size), Image.Resampling.LANCZOS)
+    face_overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    face_overlay.paste(face_img, ((width - face_size) // 2, (height - face_size) // 2))
+
+    def wrap_text(text, max_chars_per_line=40):
+        words, lines, current_line, current_length = text.split(), [], [], 0
+        for word in words:
+            if current_length + len(word) + len(current_line) <= max_chars_per_line:
+                current_line.append(word)
+                current_length += len(word)
+            else:
+                if current_line:
+                    lines.append(' '.join(current_line))
+                current_line, current_length = [word], len(word)
+        if current_line:
+            lines.append(' '.join(current_line))
+        return lines
+
+    clean = lambda text: text.replace("'", "").replace(":", "")
+    clean_title_lines = [clean(line) for line in wrap_text(title)]
+    title_fontsize, footer_fontsize = int(height * 0.04), int(height * 0.03)
+    title_borderw, footer_borderw = max(1, int(height * 0.002)), max(1, int(height * 0.0015))
+
+    filter_parts = [
+        "[1:v]fade=t=in:st=4:d=0.5:alpha=1,fade=t=out:st=5.5:d=0.5:alpha=1[face]",
+        "[0:v][face]overlay=0:0[bg_face]",
+    ]
+    current_input = "bg_face"
+    line_height = title_fontsize + 10
+    start_y = (height - len(clean_title_lines) * line_height) // 2
+    for i, line in enumerate(clean_title_lines):
+        label = "with_title" if i == len(clean_title_lines) - 1 else f"title_{i}"
+        filter_parts.append(
+            f"[{current_input}]drawtext=text='{line}':fontsize={title_fontsize}:fontcolor=white:borderw={title_borderw}:bordercolor=black:x=(w-text_w)/2:y={start_y + i * line_height}:enable=between(t\\,6\\,8)[{label}]"
+        )
+        current_input = label
+    filter_parts.append(
+        f"[with_title]drawtext=text='{clean(footer)}':fontsize={footer_fontsize}:fontcolor=white:borderw={footer_borderw}:bordercolor=black:x=40:y=h-text_h-40:enable=between(t\\,6.5\\,8)[final]"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        face_overlay_path = str(Path(tmp_dir) / "temp_face_overlay.png")
+        face_overlay.save(face_overlay_path)
+        subprocess.run([
+            'ffmpeg', '-y',
+            '-i', str(background_path),
+            '-loop', '1', '-i', face_overlay_path,
+            '-filter_complex', ";".join(filter_parts),
+            '-map', '[final]',
+            '-map', '0:a',
+            '-c:a', 'copy',
+            '-c:v', 'libx264',
+            '-t', '8',
+            str(output_path)
+        ], check=True, capture_output=True)
+
+def baseline_combine(intro_video: Path, main_video: Path, output_path: Path):
+    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_streams', '-show_format', str(main_video)]
+    data = json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)
+    video_stream = next(s for s in data['streams'] if s['codec_type'] == 'video')
+    width, height = int(video_stream['width']), int(video_stream['height'])
+    main_audio_info = next((s for s in data['streams'] if s['codec_type'] == 'audio'), None)
+    original_sample_rate = main_audio_info.get('sample_rate', '44100') if main_audio_info else '44100'
+    original_channels = main_audio_info.get('channels', 2) if main_audio_info else 2
+    intro_duration = 8.0
+    subprocess.run([
+        'ffmpeg', '-y',
+        '-i', str(intro_video),
+        '-i', str(main_video),
+        '-filter_complex',
+        f'''
+        [0:v]scale={width}:{height}[intro_v];
+        [1:v]scale={width}:{height}[main_v];
+        [intro_v][main_v]concat=n=2:v=1:a=0[final_v];
+        [0:a]atrim=end={intro_duration}[intro_a];
+        [intro_a][1:a]concat=n=2:v=0:a=1[final_a]
+        ''',
+        '-map', '[final_v]',
+        '-map', '[final_a]',
+        '-c:v', 'libx264',
+        '-c:a', 'aac',
+        '-b:a', '192k',
+        '-ar', str(original_sample_rate),
+        '-ac', str(original_channels),
+        '-shortest',
+        '-movflags', '+faststart',
+        '-pix_fmt', 'yuv420p',
+        str(output_path)
+    ], check=True, capture_output=True)
+
+def golden_composite(fixtures: dict, output_path: Path, golden_dir: Path):
+    baseline_composite(fixtures["background"], fixtures["face"], TITLE, FOOTER, output_path)
+
+def golden_combine(fixtures: dict, output_path: Path, golden_dir: Path):
+    # The golden intro is the input, so combine is checked in isolation
+    baseline_combine(golden_dir / "composite.mp4", fixtures["main"], output_path)
+
+def golden_combine_main_x264(fixtures: dict, output_path: Path, golden_dir: Path):
+    baseline_combine(golden_dir / "composite.mp4", fixtures["main-x264"], output_path)
+
+# ---------------------------------------------------------------------------
+# Candidate render paths
+# ---------------------------------------------------------------------------
+
+def render_composite(fixtures: dict, output_path: Path, golden_dir: Path):
+    import cli
+    cli.composite_video(fixtures["background"], fixtures["face"], TITLE, FOOTER, output_path, use_mezzanine=False)
+
+def render_composite_mezzanine(fixtures: dict, output_path: Path, golden_dir: Path):
+    import cli
+    # Its own cache, so a harness run never evicts the real cache/mezzanine entries
+    cli.composite_video(fixtures["background"], fixtures["face"], TITLE, FOOTER, output_path, use_mezzanine=True,
+                        mezzanine_dir=golden_dir / "mezzanine")
+
+def render_combine(fixtures: dict, output_path: Path, golden_dir: Path):
+    import cli
+    # The golden intro is the input, so combine is checked in isolation
+    cli.combine_videos(golden_dir / "composite.mp4", fixtures["main"], output_path, 0.8)
+
+def render_combine_fragmented(fixtures: dict, output_path: Path, golden_dir: Path):
+    import cli
+    cli.combine_videos(golden_dir / "composite.mp4", fixtures["main"], output_path, 0.8, fragmented=True)
+
+def render_combine_stream_copy(fixtures: dict, output_path: Path, golden_dir: Path):
+    import cli
+    cli.combine_videos(golden_dir / "composite.mp4", fixtures["main"], output_path, 0.8,
+                       stream_copy=True, fragmented=True)
+
+def render_publish(fixtures: dict, output_path: Path, golden_dir: Path):
+    import cli
+    cli.publish_video(fixtures["background"], fixtures["face"], TITLE, FOOTER, fixtures["main"], output_path,
+                      stream_copy=False, use_mezzanine=False)
+
+def render_publish_stream_copy(fixtures: dict, output_path: Path, golden_dir: Path):
+    import cli
+    cli.publish_video(fixtures["background"], fixtures["face"], TITLE, FOOTER, fixtures["main"], output_path,
+                      stream_copy=True, use_mezzanine=True, mezzanine_dir=golden_dir / "mezzanine")
+
+def render_combine_stream_copy_x264(fixtures: dict, output_path: Path, golden_dir: Path):
+    import cli
+    cli.combine_videos(golden_dir / "composite.mp4", fixtures["main-x264"], output_path, 0.8, stream_copy=True)
+
+# Golden outputs, all from the frozen baseline recipes above
+GOLDEN_RECIPES = {
+    "composite": golden_composite,
+    "combine": golden_combine,
+    "combine-main-x264": golden_combine_main_x264,
+}
+
+# Candidate paths, each compared with `golden`; register new fast paths here before
+# switching them on.
+CASES = {
+    "composite": dict(golden="composite", render=render_composite),
+    "composite-mezzanine": dict(golden="composite", render=render_composite_mezzanine),
+    "combine": dict(golden="combine", render=render_combine),
+    "combine-fragmented": dict(golden="combine", render=render_combine_fragmented),
+    # Different encodes of the same pictures: the golden re-encoded the main video,
+    # stream copy keeps the original, so only near-equality is expected. Copying AAC
+    # across the join keeps the main video's priming frame and the intro's last
+    # partial frame, up to ~2 AAC frames of extra audio.
+    "combine-stream-copy": dict(golden="combine", render=render_combine_stream_copy,
+                                min_psnr=40.0, min_ssim=0.98, audio_exact=False, audio_slack=0.1),
+    # Main video whose parameter sets the intro can't match: must not be stream-copied
+    "combine-stream-copy-x264-settings": dict(golden="combine-main-x264", render=render_combine_stream_copy_x264,
+                                              min_psnr=40.0, min_ssim=0.98, audio_exact=False, audio_slack=0.1),
+    # The golden encoded the intro twice (composite, then combine); publish encodes it
+    # once, so the intro is closer to the source than the golden, not identical to it.
+    "publish": dict(golden="combine", render=render_publish, min_psnr=35.0, min_ssim=0.97,
+                    audio_exact=False, audio_slack=0.1),
+    "publish-stream-copy": dict(golden="combine", render=render_publish_stream_copy, min_psnr=35.0,
+                                min_ssim=0.97, audio_exact=False, audio_slack=0.1),
+}
+
+def probe_streams(path: Path) -> list:
+    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_streams', str(path)]
+    return json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)['streams']
+
+def decode_planes(path: Path, width: int, height: int) -> dict:
+    """Decode every video frame as 4:2:0 into Y, U and V arrays of shape (n, plane height, plane width)."""
+    result = run_ffmpeg(['-i', str(path), '-map', '0:v:0', '-f', 'rawvideo', '-pix_fmt', 'yuv420p', '-'])
+    chroma_width, chroma_height = (width + 1) // 2, (height + 1) // 2
+    luma_bytes, chroma_bytes = width * height, chroma_width * chroma_height
+    frames = np.frombuffer(result.stdout, dtype=np.uint8).reshape(-1, luma_bytes + 2 * chroma_bytes)
+    return {
+        "Y": frames[:, :luma_bytes].reshape(-1, height, width),
+        "U": frames[:, luma_bytes:luma_bytes + chroma_bytes].reshape(-1, chroma_height, chroma_width),
+        "V": frames[:, luma_bytes + chroma_bytes:].reshape(-1, chroma_height, chroma_width),
+    }
+
+def decode_audio(path: Path, sample_rate: int, channels: int) -> np.ndarray:
+    """Decode the first audio stream to interleaved int16 samples, shaped (n, channels)."""
+    result = run_ffmpeg(['-i', str(path), '-map', '0:a:0', '-f', 's16le', '-acodec', 'pcm_s16le',
+                         '-ar', str(sample_rate), '-ac', str(channels), '-'])
+    return np.frombuffer(result.stdout, dtype=np.int16).reshape(-1, channels)
+
+def parameter_set_counts(path: Path) -> dict:
+    """Distinct H.264 SPS and PPS in the video bitstream.
+    
+    An MP4 holds one avcC, so a join whose parts carry different parameter sets only
+    decodes right in players that honour in-band SPS/PPS (FFmpeg does, so the pixel
+    comparison alone can't see it).
+    """
+    result = run_ffmpeg(['-i', str(path), '-map', '0:v:0', '-c', 'copy', '-bsf:v', 'h264_mp4toannexb', '-f', 'h264', '-'])
+    found = {"SPS": set(), "PPS": set()}
+    for nal in re.split(b'\x00\x00\x01', result.stdout)[1:]:
+        nal = nal.rstrip(b'\x00')
+        kind = {7: "SPS", 8: "PPS"}.get(nal[0] & 0x1f) if nal else None
+        if kind:
+            found[kind].add(nal)
+    return {kind: len(units) for kind, units in found.items()}
+
+def frame_psnr(golden: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    diff = golden.astype(np.float64) - candidate.astype(np.float64)
+    mse = (diff ** 2).mean(axis=(1, 2))
+    with np.errstate(divide='ignore'):
+        return np.where(mse == 0, np.inf, 10 * np.log10(255.0 ** 2 / mse))
+
+def _box_mean(x: np.ndarray, k: int) -> np.ndarray:
+    """Mean over every k x k window of each frame, via an integral image."""
+    c = np.pad(x.cumsum(axis=1).cumsum(axis=2), ((0, 0), (1, 0), (1, 0)))
+    return (c[:, k:, k:] - c[:, :-k, k:] - c[:, k:, :-k] + c[:, :-k, :-k]) / (k * k)
+
+def frame_ssim(golden: np.ndarray, candidate: np.ndarray, window: int = 8, chunk: int = 32) -> np.ndarray:
+    """Mean SSIM per frame with a uniform window, processed in chunks to bound memory."""
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    scores = []
+    for start in range(0, len(golden), chunk):
+        x = golden[start:start + chunk].astype(np.float64)
+        y = candidate[start:start + chunk].astype(np.float64)
+        mu_x, mu_y = _box_mean(x, window), _box_mean(y, window)
+        var_x = _box_mean(x * x, window) - mu_x ** 2
+        var_y = _box_mean(y * y, window) - mu_y ** 2
+        cov = _box_mean(x * y, window) - mu_x * mu_y
+        ssim_map = ((2 * mu_x * mu_y + c1) * (2 * cov + c2)) / ((mu_x ** 2 + mu_y ** 2 + c1) * (var_x + var_y + c2))
+        scores.append(ssim_map.mean(axis=(1, 2)))
+    return np.concatenate(scores) if scores else np.array([])
+
+def av_offset(streams: list) -> float:
+    """Start-time offset of audio relative to video, in seconds."""
+    video = next(s for s in streams if s['codec_type'] == 'video')
+    audio = next((s for s in streams if s['codec_type'] == 'audio'), None)
+    if audio is None:
+        return 0.0
+    return float(audio.get('start_time', 0)) - float(video.get('start_time', 0))
+
+def join_offset(golden: np.ndarray, candidate: np.ndarray, sample_rate: int, join_seconds: float,
+                window: float = 0.5, max_lag: float = 0.2) -> Optional[float]:
+    """How far the candidate's audio just after the join is shifted from the golden's, in seconds.
+    
+    Cross-correlates the first `window` seconds of golden audio after the join with the
+    candidate's, over lags of up to +/- max_lag. None if either is too short.
+    """
+    start, length, lag = (int(round(x * sample_rate)) for x in (join_seconds, window, max_lag))
+    reference = golden[start:start + length].mean(axis=1)
+    search = candidate[max(0, start - lag):start + length + lag].mean(axis=1)
+    if len(reference) < length or len(search) < length + 2 * lag or start < lag:
+        return None
+    size = len(search) + len(reference)
+    correlation = np.fft.irfft(np.fft.rfft(search, size) * np.conj(np.fft.rfft(reference, size)), size)
+    return (int(np.argmax(correlation[:2 * lag + 1])) - lag) / sample_rate
+
+def compare_outputs(golden_path: Path, candidate_path: Path, report_dir: Path,
+                    min_psnr: float = 40.0, min_ssim: float = 0.98, audio_exact: bool = True,
+                    audio_slack: float = None, join_seconds: float = None) -> dict:
+    """Compare a candidate render with its golden and write a per-frame report.
+    
+    Every frame's Y, U and V planes must reach min_psnr and min_ssim. Audio length may
+    differ by audio_slack seconds (default: one video frame); with join_seconds, the
+    audio after that join must line up with the golden's to within half a video frame.
+    """
+    failures = []
+    golden_streams, candidate_streams = probe_streams(golden_path), probe_streams(candidate_path)
+
+    # Stream parameters
+    if len(golden_streams) != len(candidate_streams):
+        failures.append(f"stream count {len(candidate_streams)} != golden {len(golden_streams)}")
+    for index, (g, c) in enumerate(zip(golden_streams, candidate_streams)):
+        for key in STREAM_KEYS:
+            if g.get(key) != c.get(key):
+                failures.append(f"stream {index} {key}: {c.get(key)!r} != golden {g.get(key)!r}")
+
+    g_video = next(s for s in golden_streams if s['codec_type'] == 'video')
+    c_video = next((s for s in candidate_streams if s['codec_type'] == 'video'), None)
+    if c_video is not None and c_video.get('codec_name') == 'h264':
+        for kind, count in parameter_set_counts(candidate_path).items():
+            if count > 1:
+                failures.append(f"{count} different {kind}s in one video stream (only the first is in avcC)")
+    frame_seconds = 1.0 / eval(g_video['r_frame_rate'])
+
+    # A/V sync: audio must start where it did, within one frame
+    offset_drift = abs(av_offset(candidate_streams) - av_offset(golden_streams))
+    if offset_drift > frame_seconds:
+        failures.append(f"A/V offset drifted by {offset_drift * 1000:.1f}ms")
+    for g, c in zip(golden_streams, candidate_streams):
+        if 'duration' in g and 'duration' in c and abs(float(g['duration']) - float(c['duration'])) > frame_seconds:
+            failures.append(f"{g['codec_type']} duration {float(c['duration']):.3f}s != golden {float(g['duration']):.3f}s")
+
+    summary = {"frames": 0, "min_psnr": None, "min_ssim": None, "bad_frames": []}
+    width, height = int(g_video['width']), int(g_video['height'])
+    if c_video is not None and (int(c_video['width']), int(c_video['height'])) == (width, height):
+        golden_planes = decode_planes(golden_path, width, height)
+        candidate_planes = decode_planes(candidate_path, width, height)
+        golden_frames, candidate_frames = golden_planes["Y"], candidate_planes["Y"]
+        if len(golden_frames) != len(candidate_frames):
+            failures.append(f"frame count {len(candidate_frames)} != golden {len(golden_frames)}")
+        count = min(len(golden_frames), len(candidate_frames))
+        plane_psnr = {name: frame_psnr(golden_planes[name][:count], candidate_planes[name][:count]) for name in "YUV"}
+        plane_ssim = {name: frame_ssim(golden_planes[name][:count], candidate_planes[name][:count]) for name in "YUV"}
+        psnr = np.minimum.reduce(list(plane_psnr.values()))
+        ssim = np.minimum.reduce(list(plane_ssim.values()))
+        bad = np.flatnonzero((psnr < min_psnr) | (ssim < min_ssim))
+        summary.update(frames=count, min_psnr=float(psnr.min()) if count else None,
+                       min_ssim=float(ssim.min()) if count else None, bad_frames=bad.tolist())
+        if len(bad):
+            worst_plane = min("YUV", key=lambda name: plane_psnr[name].min())
+            failures.append(f"{len(bad)} frames below {min_psnr}dB PSNR / {min_ssim} SSIM "
+                            f"(first: {bad[0]}, worst PSNR {psnr.min():.2f}dB in {worst_plane})")
+
+        report_dir.mkdir(parents=True, exist_ok=True)
+        with open(report_dir / "frames.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", *(f"psnr_{name.lower()}_db" for name in "YUV"), *(f"ssim_{name.lower()}" for name in "YUV")])
+            for i in range(count):
+                writer.writerow([i, *(f"{plane_psnr[name][i]:.3f}" for name in "YUV"),
+                                 *(f"{plane_ssim[name][i]:.5f}" for name in "YUV")])
+        if count and (len(bad) or failures):
+            worst = int(np.argmin(psnr))
+            diff = np.abs(golden_frames[worst].astype(np.int16) - candidate_frames[worst].astype(np.int16))
+            amplified = np.clip(diff * 8, 0, 255).astype(np.uint8)
+            strip = np.hstack([golden_frames[worst], candidate_frames[worst], amplified])
+            Image.fromarray(strip).save(report_dir / f"worst_frame_{worst}.png")
+
+    # Audio samples
+    g_audio = next((s for s in golden_streams if s['codec_type'] == 'audio'), None)
+    c_audio = next((s for s in candidate_streams if s['codec_type'] == 'audio'), None)
+    if (g_audio is None) != (c_audio is None):
+        failures.append("audio stream presence differs")
+    elif g_audio is not None:
+        rate, channels = int(g_audio['sample_rate']), int(g_audio['channels'])
+        golden_samples = decode_audio(golden_path, rate, channels)
+        candidate_samples = decode_audio(candidate_path, rate, channels)
+        count = min(len(golden_samples), len(candidate_samples))
+        slack = frame_seconds if audio_slack is None else audio_slack
+        if abs(len(golden_samples) - len(candidate_samples)) > rate * slack:
+            failures.append(f"audio length {len(candidate_samples)} samples != golden {len(golden_samples)}")
+        mismatch = np.flatnonzero((golden_samples[:count] != candidate_samples[:count]).any(axis=1))
+        summary["audio_mismatched_samples"] = int(len(mismatch))
+        if join_seconds is not None:
+            offset = join_offset(golden_samples, candidate_samples, rate, join_seconds)
+            summary["join_offset"] = offset
+            if offset is None:
+                failures.append(f"audio too short to check the join at {join_seconds:g}s")
+            elif abs(offset) > frame_seconds / 2:
+                failures.append(f"audio after the {join_seconds:g}s join is shifted by {offset * 1000:+.1f}ms")
+        if audio_exact and len(mismatch):
+            max_diff = int(np.abs(golden_samples[:count].astype(np.int32) - candidate_samples[:count]).max())
+            failures.append(f"{len(mismatch)} audio samples differ (first at {mismatch[0] / rate:.3f}s, max diff {max_diff})")
+
+    summary["failures"] = failures
+    summary["passed"] = not failures
+    report_dir.mkdir(parents=True, exist_ok=True)
+    (report_dir / "summary.json").write_text(json.dumps(summary, indent=2))
+    return summary
+
+def update_goldens(golden_dir: Path = GOLDEN_DIR):
+    """Render fixtures and golden outputs with the frozen baseline recipes."""
+    import cli
+    if golden_dir.exists():
+        shutil.rmtree(golden_dir)
+    fixtures = make_fixtures(golden_dir / "fixtures")
+    for name, recipe in GOLDEN_RECIPES.items():
+        typer.echo(f"🥇 Rendering golden {name}...")
+        recipe(fixtures, golden_dir / f"{name}.mp4", golden_dir)
+    (golden_dir / "golden.json").write_text(json.dumps({"tools": cli.tool_versions(), "created_at": time.time()}, indent=2))
+    typer.echo(f"✅ Goldens saved to {golden_dir}")
+
+def run_harness(case_names: list = None, golden_dir: Path = GOLDEN_DIR, report_dir: Path = REPORT_DIR) -> bool:
+    """Render each case and compare it with its golden; returns True if all pass."""
+    import cli
+    if not (golden_dir / "golden.json").exists():
+        typer.echo(f"❌ No goldens in {golden_dir}; render them with --update-golden")
+        return False
+    recorded = json.loads((golden_dir / "golden.json").read_text())["tools"]
+    if recorded.get("ffmpeg") != cli.tool_versions().get("ffmpeg"):
+        typer.echo("⚠️ Goldens were rendered with a different ffmpeg; encoder changes may show up as diffs")
+
+    fixtures = fixture_paths(golden_dir)
+    if report_dir.exists():
+        shutil.rmtree(report_dir)
+    all_passed = True
+    rows = []
+    for name in case_names or list(CASES):
+        if name not in CASES:
+            typer.echo(f"❌ Unknown case '{name}' (known: {', '.join(CASES)})")
+            return False
+        case = CASES[name]
+        started = time.time()
+        with cli.job_scratch("equivalence-") as scratch_dir:
+            candidate_path = scratch_dir / f"{name}.mp4"
+            try:
+                case["render"](fixtures, candidate_path, golden_dir)
+                summary = compare_outputs(
+                    golden_dir / f"{case['golden']}.mp4", candidate_path, report_dir / name,
+                    min_psnr=case.get("min_psnr", 40.0), min_ssim=case.get("min_ssim", 0.98),
+                    audio_exact=case.get("audio_exact", True), audio_slack=case.get("audio_slack"),
+                    join_seconds=JOIN_SECONDS if case["golden"].startswith("combine") else None,
+                )
+            except Exception as e:
+                # One broken path shouldn't cost the report for the others
+                failure = f"render failed: {type(e).__name__}: {e}"
+                if isinstance(e, subprocess.CalledProcessError) and e.stderr:
+                    stderr = e.stderr.decode(errors="replace") if isinstance(e.stderr, bytes) else e.stderr
+                    failure += f" ({(stderr.strip().splitlines() or [''])[-1]})"
+                summary = {"frames": 0, "min_psnr": None, "min_ssim": None, "failures": [failure], "passed": False}
+                (report_dir / name).mkdir(parents=True, exist_ok=True)
+                (report_dir / name / "summary.json").write_text(json.dumps(summary, indent=2))
+        all_passed &= summary["passed"]
+        rows.append((name, summary, time.time() - started))
+
+    typer.echo(f"\n{'case':<34} {'result':<6} {'frames':>6} {'min PSNR':>9} {'min SSIM':>9} {'time':>6}")
+    for name, summary, elapsed in rows:
+        min_psnr = "-" if summary["min_psnr"] is None else (
+            "inf" if summary["min_psnr"] == float("inf") else f"{summary['min_psnr']:.2f}")
+        min_ssim = "-" if summary["min_ssim"] is None else f"{summary['min_ssim']:.4f}"
+        typer.echo(f"{name:<34} {'PASS' if summary['passed'] else 'FAIL':<6} {summary['frames']:>6} "
+                   f"{min_psnr:>9} {min_ssim:>9} {elapsed:>5.1f}s")
+        for failure in summary["failures"]:
+            typer.echo(f"    ❌ {failure}")
+    if not all_passed:
+        typer.echo(f"\n📋 Per-frame reports and worst-frame diffs in {report_dir}/")
+    return all_passed
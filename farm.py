@@ -0,0 +1,402 @@
+"""Render farm: a SQLite job queue that spreads `main` and `combine` renders across hosts.
+
+The queue is a single SQLite file, so any shared filesystem (NFS, SMB) works as the
+coordination point without an external service. Workers lease jobs, heartbeat while
+they run them, and a job whose lease expires (worker died) is handed to another worker
+until it runs out of attempts. Jobs render to a worker-private staging file that only
+replaces the real output once the worker confirms it still holds the lease, so a
+worker that lost its lease can't overwrite the output of the one that took over.
+"""
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import typer
+
+DEFAULT_DB = Path(os.getenv("INTRO_FARM_DB", "cache/farm.db"))
+LEASE_SECONDS = 60
+HEARTBEAT_SECONDS = 15
+# Big `combine` encodes ask for at least this many cores unless told otherwise
+COMBINE_MIN_CORES = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    min_cores INTEGER NOT NULL DEFAULT 1,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    depends_on INTEGER REFERENCES jobs (id),
+    worker_id TEXT,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, min_cores);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    cores INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    current_job INTEGER,
+    jobs_done INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+def connect(db_path: Path = DEFAULT_DB) -> sqlite3.Connection:
+    """Open the queue database, creating it if needed.
+
+    Uses SQLite's default rollback journal: WAL mode relies on shared memory and is
+    not safe when the database lives on a network filesystem.
+    """
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+def submit_job(conn: sqlite3.Connection, kind: str, params: dict,
+               min_cores: int = 1, max_attempts: int = 3, depends_on: int = None) -> int:
+    cursor = conn.execute(
+        "INSERT INTO jobs (kind, params, min_cores, max_attempts, depends_on, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (kind, json.dumps(params), min_cores, max_attempts, depends_on, time.time()),
+    )
+    return cursor.lastrowid
+
+def producer_of(conn: sqlite3.Connection, output_path: str):
+    """The newest unfailed job that writes output_path, so consumers can wait for it."""
+    for row in conn.execute("SELECT id, params FROM jobs WHERE status != 'failed' ORDER BY id DESC"):
+        if json.loads(row["params"]).get("output_path") == output_path:
+            return row["id"]
+    return None
+
+def register_worker(conn: sqlite3.Connection, worker_id: str, cores: int):
+    now = time.time()
+    conn.execute(
+        "INSERT OR REPLACE INTO workers (id, host, cores, started_at, last_seen) VALUES (?, ?, ?, ?, ?)",
+        (worker_id, socket.gethostname(), cores, now, now),
+    )
+
+def expire_leases(conn: sqlite3.Connection, now: float):
+    """Requeue jobs whose worker stopped heartbeating, or fail them when out of attempts."""
+    conn.execute(
+        """
+        UPDATE jobs SET
+            status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+            error = 'lease expired on worker ' || worker_id,
+            finished_at = CASE WHEN attempts >= max_attempts THEN ? ELSE NULL END,
+            worker_id = NULL, lease_expires = NULL
+        WHERE status = 'leased' AND lease_expires < ?
+        """,
+        (now, now),
+    )
+
+def fail_dependents(conn: sqlite3.Connection, now: float):
+    """Fail queued jobs waiting on a failed job: they can never run.
+
+    Repeats until nothing changes, so a failure cascades down whole dependency chains.
+    """
+    while conn.execute(
+        """
+        UPDATE jobs SET status = 'failed', finished_at = ?, error = 'dependency ' || depends_on || ' failed'
+        WHERE status = 'queued' AND depends_on IN (SELECT id FROM jobs WHERE status = 'failed')
+        """,
+        (now,),
+    ).rowcount:
+        pass
+
+def claim_job(conn: sqlite3.Connection, worker_id: str, cores: int,
+              lease_seconds: float = LEASE_SECONDS):
+    """Lease the next job this worker should run, or return None.
+
+    Jobs go to workers with at least `min_cores` cores, biggest jobs first, so large
+    `combine` encodes land on large machines. A job that needs more cores than any live
+    worker advertises is open to everyone rather than starving. Jobs wait until the
+    job they depend on is done.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        expire_leases(conn, now)
+        fail_dependents(conn, now)
+        biggest = conn.execute(
+            "SELECT MAX(cores) FROM workers WHERE last_seen >= ?", (now - lease_seconds,)
+        ).fetchone()[0] or cores
+        job = conn.execute(
+            """
+            SELECT * FROM jobs
+            WHERE status = 'queued' AND (min_cores <= ? OR min_cores > ?)
+                AND (depends_on IS NULL OR depends_on IN (SELECT id FROM jobs WHERE status = 'done'))
+            ORDER BY min_cores DESC, id
+            LIMIT 1
+            """,
+            (cores, max(biggest, cores)),
+        ).fetchone()
+        if job is not None:
+            conn.execute(
+                """
+                UPDATE jobs SET status = 'leased', worker_id = ?, lease_expires = ?,
+                    attempts = attempts + 1, started_at = ?, error = NULL
+                WHERE id = ?
+                """,
+                (worker_id, now + lease_seconds, now, job["id"]),
+            )
+        conn.execute(
+            "UPDATE workers SET last_seen = ?, current_job = ? WHERE id = ?",
+            (now, job["id"] if job is not None else None, worker_id),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return job
+
+def heartbeat(conn: sqlite3.Connection, worker_id: str, job_id: int,
+              lease_seconds: float = LEASE_SECONDS) -> bool:
+    """Extend a job's lease; False means the lease was lost to another worker."""
+    now = time.time()
+    conn.execute("UPDATE workers SET last_seen = ? WHERE id = ?", (now, worker_id))
+    cursor = conn.execute(
+        "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker_id = ? AND status = 'leased'",
+        (now + lease_seconds, job_id, worker_id),
+    )
+    return cursor.rowcount == 1
+
+def staging_path(output_path: Path, worker_id: str) -> Path:
+    """Worker-private file a job renders to before finish_job moves it into place."""
+    return output_path.with_name(f".{output_path.stem}.{worker_id}.part{output_path.suffix}")
+
+def finish_job(conn: sqlite3.Connection, worker_id: str, job_id: int, error: str = None,
+               staged_output: Path = None, output_path: Path = None) -> bool:
+    """Mark a leased job done, or requeue/fail it after an error.
+
+    Returns False if the worker no longer holds the lease; the job then belongs to
+    someone else and its result is dropped. On success, staged_output is renamed to
+    output_path while the database is locked, so no other worker can take the job
+    over between the lease check and the rename.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if error is None:
+            held = conn.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ?, lease_expires = NULL "
+                "WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (now, job_id, worker_id),
+            ).rowcount == 1
+            if held and staged_output is not None:
+                os.replace(staged_output, output_path)
+            conn.execute(
+                "UPDATE workers SET jobs_done = jobs_done + ?, current_job = NULL, last_seen = ? WHERE id = ?",
+                (1 if held else 0, now, worker_id),
+            )
+        else:
+            held = conn.execute(
+                """
+                UPDATE jobs SET
+                    status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                    finished_at = CASE WHEN attempts >= max_attempts THEN ? ELSE NULL END,
+                    error = ?, worker_id = NULL, lease_expires = NULL
+                WHERE id = ? AND worker_id = ? AND status = 'leased'
+                """,
+                (now, error, job_id, worker_id),
+            ).rowcount == 1
+            conn.execute(
+                "UPDATE workers SET current_job = NULL, last_seen = ? WHERE id = ?", (now, worker_id)
+            )
+            fail_dependents(conn, now)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        if staged_output is not None and staged_output.exists():
+            staged_output.unlink()
+    return held
+
+def execute_job(kind: str, params: dict, output_path: Path = None):
+    """Run one job in-process using the same functions as the CLI commands.
+
+    output_path overrides where the job writes, e.g. a staging_path.
+    """
+    import cli
+
+    if kind == "main":
+        cli.composite_video(
+            Path(params["background_video"]), Path(params["reference_image"]),
+            params["title"], params["footer"], output_path or Path(params["output_path"]),
+        )
+    elif kind == "combine":
+        cli.combine_videos(
+            Path(params["intro_video"]), Path(params["main_video"]),
+            output_path or Path(params["output_path"]), params.get("transition_duration", 0.8),
+        )
+    elif kind == "sleep":
+        # Synthetic job used by the local simulation harness
+        time.sleep(params["seconds"])
+    else:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+def run_worker(db_path: Path = DEFAULT_DB, cores: int = None, worker_id: str = None,
+               poll_interval: float = 2.0, lease_seconds: float = LEASE_SECONDS,
+               heartbeat_seconds: float = HEARTBEAT_SECONDS, exit_when_idle: bool = False):
+    """Pull and run jobs until interrupted (or until the queue drains, with exit_when_idle)."""
+    cores = cores or os.cpu_count() or 1
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    conn = connect(db_path)
+    register_worker(conn, worker_id, cores)
+    typer.echo(f"👷 Worker {worker_id} ready with {cores} cores")
+
+    while True:
+        job = claim_job(conn, worker_id, cores, lease_seconds)
+        if job is None:
+            if exit_when_idle:
+                active = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'leased')"
+                ).fetchone()[0]
+                if active == 0:
+                    typer.echo(f"👋 Worker {worker_id}: queue drained")
+                    return
+            time.sleep(poll_interval)
+            continue
+
+        typer.echo(f"🎬 Worker {worker_id}: job {job['id']} ({job['kind']}, attempt {job['attempts'] + 1})")
+
+        # Heartbeat on a separate connection; sqlite3 connections are per-thread
+        stop = threading.Event()
+        def beat(job_id=job["id"]):
+            beat_conn = connect(db_path)
+            try:
+                while not stop.wait(heartbeat_seconds):
+                    if not heartbeat(beat_conn, worker_id, job_id, lease_seconds):
+                        typer.echo(f"⚠️ Worker {worker_id}: lost lease on job {job_id}; its output will be discarded")
+                        return
+            finally:
+                beat_conn.close()
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+
+        params = json.loads(job["params"])
+        output_path = Path(params["output_path"]) if "output_path" in params else None
+        staged = staging_path(output_path, worker_id) if output_path else None
+        error = None
+        try:
+            execute_job(job["kind"], params, staged)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        except KeyboardInterrupt:
+            finish_job(conn, worker_id, job["id"], "worker interrupted", staged)
+            raise
+        finally:
+            stop.set()
+            beater.join()
+
+        if not finish_job(conn, worker_id, job["id"], error, staged, output_path):
+            typer.echo(f"⚠️ Worker {worker_id}: job {job['id']} was taken over by another worker; result discarded")
+            continue
+        typer.echo(f"{'❌' if error else '✅'} Worker {worker_id}: job {job['id']} {error or 'done'}")
+
+def queue_stats(conn: sqlite3.Connection, window_seconds: float = 300) -> dict:
+    """Queue depth, throughput over the last window, and per-worker activity."""
+    now = time.time()
+    by_status = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+    queued_by_cores = dict(conn.execute(
+        "SELECT min_cores, COUNT(*) FROM jobs WHERE status = 'queued' GROUP BY min_cores"
+    ).fetchall())
+    finished = conn.execute(
+        "SELECT COUNT(*), AVG(finished_at - started_at) FROM jobs WHERE status = 'done' AND finished_at >= ?",
+        (now - window_seconds,),
+    ).fetchone()
+    retried = conn.execute("SELECT COUNT(*) FROM jobs WHERE attempts > 1").fetchone()[0]
+    workers = [dict(row) for row in conn.execute(
+        "SELECT id, host, cores, jobs_done, current_job, last_seen FROM workers ORDER BY cores DESC, id"
+    )]
+    return {
+        "by_status": by_status,
+        "queued_by_cores": queued_by_cores,
+        "done_in_window": finished[0],
+        "throughput_per_min": finished[0] * 60.0 / window_seconds,
+        "avg_job_seconds": finished[1],
+        "retried": retried,
+        "workers": workers,
+        "now": now,
+    }
+
+def print_stats(stats: dict, lease_seconds: float = LEASE_SECONDS):
+    by_status = stats["by_status"]
+    typer.echo("📊 Queue: " + ", ".join(
+        f"{status} {by_status.get(status, 0)}" for status in ("queued", "leased", "done", "failed")
+    ))
+    if stats["queued_by_cores"]:
+        typer.echo("   Waiting by core requirement: " + ", ".join(
+            f"{cores}+ cores: {count}" for cores, count in sorted(stats["queued_by_cores"].items())
+        ))
+    avg = stats["avg_job_seconds"]
+    typer.echo(
+        f"⚡ Throughput: {stats['throughput_per_min']:.1f} jobs/min "
+        f"({stats['done_in_window']} done recently"
+        + (f", avg {avg:.1f}s/job" if avg is not None else "") + f"), {stats['retried']} retried"
+    )
+    for worker in stats["workers"]:
+        alive = stats["now"] - worker["last_seen"] < lease_seconds
+        current = f"job {worker['current_job']}" if worker["current_job"] else "idle"
+        typer.echo(
+            f"   {'🟢' if alive else '⚫'} {worker['id']} ({worker['host']}, {worker['cores']} cores): "
+            f"{worker['jobs_done']} done, {current if alive else 'offline'}"
+        )
+
+def simulate(db_path: Path, worker_cores: list, jobs: int = 12, job_seconds: float = 1.0,
+             kill_after: float = None):
+    """Run several local worker processes against one queue to exercise the farm.
+
+    Every third job is a `combine`-sized job that asks for COMBINE_MIN_CORES and runs
+    three times longer. With kill_after, the first worker is killed mid-run so its
+    job has to be picked up again once the lease expires.
+    """
+    if Path(db_path).exists():
+        Path(db_path).unlink()
+    conn = connect(db_path)
+    for i in range(jobs):
+        if i % 3 == 2:
+            submit_job(conn, "sleep", {"seconds": job_seconds * 3}, min_cores=COMBINE_MIN_CORES)
+        else:
+            submit_job(conn, "sleep", {"seconds": job_seconds})
+
+    # Short leases so a dead worker's job is retried within the run
+    lease_seconds = max(2.0, job_seconds * 2)
+    processes = []
+    for i, cores in enumerate(worker_cores):
+        process = multiprocessing.Process(
+            target=run_worker,
+            kwargs=dict(
+                db_path=db_path, cores=cores, worker_id=f"sim-node{i}-{cores}c",
+                poll_interval=0.2, lease_seconds=lease_seconds,
+                heartbeat_seconds=lease_seconds / 4, exit_when_idle=True,
+            ),
+        )
+        process.start()
+        processes.append(process)
+
+    started = time.time()
+    if kill_after is not None:
+        time.sleep(kill_after)
+        typer.echo(f"💥 Killing {processes[0].name} (sim-node0) to simulate a dead worker")
+        processes[0].kill()
+
+    for process in processes:
+        process.join()
+    elapsed = time.time() - started
+
+    typer.echo(f"\n⏱️ Drained {jobs} jobs in {elapsed:.1f}s across {len(worker_cores)} simulated nodes")
+    print_stats(queue_stats(conn, window_seconds=elapsed + 1), lease_seconds)